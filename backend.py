@@ -0,0 +1,355 @@
+"""Backends de planilha: Google Sheets (gspread) ou um substituto local em memória.
+
+O app só usa estas operações de worksheet (mesma assinatura do gspread):
+get_all_values, row_values, batch_get, find, update, batch_update e
+update_cell. As worksheets do gspread já as implementam; `AbaLocal` as
+reproduz em memória para testes de carga, benchmarks e desenvolvimento
+offline. Um backend é qualquer objeto com `abrir(nome)`, que devolve a aba
+pelo nome curto ("input", "output", "comm").
+"""
+import csv
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from conversao import formatar_moeda, normalizar_id
+from diagnostico import diagnosticar, linhas_output, quadro_input, texto_boleto
+from planilha import LINHA_CABECALHO, a1_para_intervalo, coluna_letra
+
+SPREADSHEET_ID = "1zOof6YDL4U8hYMiFi5zt4V_alYK6EcRvV3QKERvNlhA"
+ABAS = {
+    "input": "INPUT - BOLETOS",
+    "output": "OUTPUT - BOLETOS",
+    "comm": "COMUNICACAO - CLIENTE",
+}
+
+# Layout das abas (a linha de cada cabeçalho está em planilha.LINHA_CABECALHO)
+CABECALHO_INPUT = ["", "Key", "Clientes", "Status", "Responsável", "SQUAD", "Verba Meta", "Verba Google",
+                   "Método Meta", "Crédito Meta", "Data Saldo Meta", "Gasto Diário Meta",
+                   "Método Google", "Crédito Google", "Data Saldo Google", "Gasto Diário Google"]
+CABECALHO_OUTPUT = ["", "Key", "Clientes", "Status", "SQUAD", "Método Meta", "Método Google", "",
+                    "Check 1 FB", "Check 1 GL", "Acordado Mídia", "Lançado Mídia", "Check 2",
+                    "Acordado Emissão", "Soma Emissão", "Check 3", "Dias Saldo Meta", "Check 4 Meta",
+                    "Dias Saldo Google", "Check 4 Google", "Crédito Meta", "Gasto Diário Meta",
+                    "Crédito Google", "Gasto Diário Google", "A Emitir Meta", "Emitido Meta", "",
+                    "Boleto Meta", "Status Meta", "", "", "", "", "", "", "",
+                    "A Emitir Google", "Emitido Google", "", "Boleto Google", "Status Google"]
+CABECALHO_COMM = ["", "Key", "Clientes", "", "", "", "Contato", "", "E-mail", "Telefone"]
+
+# Colunas do OUTPUT preenchidas pelo app (0-based): gatilhos Z/AL e status AC/AO
+COLUNAS_MANUAIS_OUTPUT = (25, 28, 37, 40)
+
+Celula = namedtuple("Celula", "row col value")
+
+
+class BackendGspread:
+    """Abre as abas do sistema pelo nome curto ("input", "output", "comm")."""
+
+    def __init__(self, cliente, spreadsheet_id=SPREADSHEET_ID):
+        self._ss = cliente.open_by_key(spreadsheet_id)
+
+    def abrir(self, nome):
+        return self._ss.worksheet(ABAS[nome])
+
+
+class ErroConexao(Exception):
+    """Falha ao conectar ou abrir as abas; a página mostra o erro em vez de derrubar o app."""
+
+
+class BackendPreguicoso:
+    """Conecta só quando alguma aba é usada pela primeira vez e então abre todas em paralelo.
+
+    `criar` monta o backend real (autorização do gspread etc.). As abas
+    devolvidas por `abrir` são `AbaPreguicosa`: criá-las não faz requisição.
+    Se a conexão falhar, a próxima operação tenta de novo.
+    """
+
+    def __init__(self, criar):
+        self._criar = criar
+        self._lock = threading.Lock()
+        self._abas = None
+
+    def conectar(self):
+        with self._lock:
+            if self._abas is None:
+                try:
+                    backend = self._criar()
+                    with ThreadPoolExecutor(max_workers=len(ABAS)) as pool:
+                        self._abas = dict(zip(ABAS, pool.map(backend.abrir, ABAS)))
+                except Exception as e:
+                    raise ErroConexao(f"{type(e).__name__}: {e}") from e
+            return self._abas
+
+    def aquecer(self):
+        """Conecta em segundo plano, enquanto a primeira tela é montada."""
+        def _conectar():
+            try:
+                self.conectar()
+            except ErroConexao:
+                pass  # a página que precisar da aba tenta de novo e mostra o erro
+        threading.Thread(target=_conectar, name="conectar-planilha", daemon=True).start()
+
+    def abrir(self, nome):
+        return AbaPreguicosa(nome, self)
+
+
+class AbaPreguicosa:
+    """Worksheet resolvida no primeiro uso (ver `BackendPreguicoso`)."""
+
+    def __init__(self, nome, backend):
+        self.nome = nome
+        self._backend = backend
+
+    def __getattr__(self, attr):
+        return getattr(self._backend.conectar()[self.nome], attr)
+
+
+# ------------------------------------------------------------------------------
+# Substituto local
+# ------------------------------------------------------------------------------
+def _exibir(valor):
+    # Como a planilha exibe o valor gravado (FORMATTED_VALUE)
+    if isinstance(valor, bool) or valor is None:
+        return "" if valor is None else str(valor).upper()
+    if isinstance(valor, int):
+        return str(valor)
+    if isinstance(valor, float):
+        return formatar_moeda(valor)
+    return str(valor)
+
+
+def _tamanho(linhas):
+    # Tamanho aproximado do payload JSON: texto da célula + aspas e vírgula
+    return sum(len(str(c)) + 3 for l in linhas for c in l)
+
+
+def _aparar(linhas):
+    linhas = [list(l) for l in linhas]
+    for l in linhas:
+        while l and l[-1] == "":
+            l.pop()
+    while linhas and not linhas[-1]:
+        linhas.pop()
+    return linhas
+
+
+class AbaLocal:
+    """Worksheet em memória. Os valores ficam crus e são formatados na leitura."""
+
+    def __init__(self, titulo, linhas=None, lock=None):
+        self.title = titulo
+        self._linhas = [list(l) for l in linhas or []]
+        self._lock = lock or threading.RLock()
+        self.versao = 0
+        self.alterada_em = 0.0
+        # Contadores por chamada, como se fossem requisições à API (usados no benchmark)
+        self.estatisticas = Counter()
+
+    def _grade(self):
+        return self._linhas
+
+    def _contar(self, metodo, linhas):
+        self.estatisticas["chamadas"] += 1
+        self.estatisticas[f"chamadas:{metodo}"] += 1
+        self.estatisticas["linhas"] += len(linhas)
+        self.estatisticas["bytes"] += _tamanho(linhas)
+
+    # --- leitura ---
+    def get_all_values(self):
+        with self._lock:
+            grade = self._grade()
+            largura = max((len(l) for l in grade), default=0)
+            valores = [[_exibir(v) for v in l] + [""] * (largura - len(l)) for l in grade]
+            self._contar("get_all_values", valores)
+            return valores
+
+    def row_values(self, row, value_render_option='FORMATTED_VALUE'):
+        with self._lock:
+            grade = self._grade()
+            linha = list(grade[row - 1]) if row <= len(grade) else []
+        if value_render_option == 'FORMATTED_VALUE':
+            linha = [_exibir(v) for v in linha]
+        while linha and linha[-1] in ("", None):
+            linha.pop()
+        self._contar("row_values", [linha])
+        return linha
+
+    def batch_get(self, ranges, **kwargs):
+        with self._lock:
+            grade = self._grade()
+            resultado = []
+            for a1 in ranges:
+                r1, c1, r2, c2 = a1_para_intervalo(a1)
+                r1, c1 = r1 or 1, c1 or 1
+                fim = r2 or len(grade)
+                bloco = []
+                for linha in grade[r1 - 1:fim]:
+                    cel = linha[c1 - 1:c2] if c2 else linha[c1 - 1:]
+                    bloco.append([_exibir(v) for v in cel])
+                resultado.append(_aparar(bloco))
+            self._contar("batch_get", [l for bloco in resultado for l in bloco])
+            return resultado
+
+    def find(self, query, in_column=None):
+        with self._lock:
+            self._contar("find", [])
+            for r, linha in enumerate(self._grade(), start=1):
+                colunas = [in_column] if in_column else range(1, len(linha) + 1)
+                for c in colunas:
+                    if c <= len(linha) and _exibir(linha[c - 1]) == query:
+                        return Celula(r, c, query)
+        return None
+
+    # --- escrita ---
+    def _gravar(self, a1, valores):
+        r1, c1, _, _ = a1_para_intervalo(a1)
+        r1, c1 = r1 or 1, c1 or 1
+        for i, linha_vals in enumerate(valores):
+            r = r1 - 1 + i
+            while len(self._linhas) <= r:
+                self._linhas.append([])
+            linha = self._linhas[r]
+            for j, v in enumerate(linha_vals):
+                c = c1 - 1 + j
+                if len(linha) <= c:
+                    linha.extend([""] * (c + 1 - len(linha)))
+                linha[c] = v
+
+    def _alterada(self):
+        self.versao += 1
+        self.alterada_em = time.monotonic()
+
+    def update(self, *args, value_input_option='RAW', **kwargs):
+        # Aceita a ordem antiga (range, valores) e a do gspread 6 (valores, range)
+        range_name = kwargs.get('range_name')
+        values = kwargs.get('values')
+        if args:
+            a, b = (list(args) + [None])[:2]
+            range_name, values = (a, b) if isinstance(a, str) else (b, a)
+        with self._lock:
+            self._contar("update", values)
+            self._gravar(range_name or "A1", values)
+            self._alterada()
+        return {'updatedRange': range_name}
+
+    def batch_update(self, data, value_input_option='RAW', **kwargs):
+        with self._lock:
+            self._contar("batch_update", [l for item in data for l in item['values']])
+            for item in data:
+                self._gravar(item['range'], item['values'])
+            self._alterada()
+        return {'totalUpdatedCells': sum(len(v) for item in data for v in item['values'])}
+
+    def update_cell(self, row, col, value):
+        with self._lock:
+            self._contar("update_cell", [[value]])
+            self._gravar(f"{coluna_letra(col)}{row}", [[value]])
+            self._alterada()
+        return {'updatedRange': f"{coluna_letra(col)}{row}"}
+
+
+class AbaSaidaLocal(AbaLocal):
+    """OUTPUT local: recalcula as colunas de fórmula a partir do INPUT.
+
+    `atraso_recalculo` simula a demora da planilha: leituras feitas antes do
+    prazo após uma escrita no INPUT ainda mostram os valores antigos.
+    """
+
+    def __init__(self, titulo, aba_input, hoje=None, atraso_recalculo=0.0, lock=None):
+        super().__init__(titulo, lock=lock)
+        self._input = aba_input
+        self._hoje = hoje
+        self.atraso_recalculo = atraso_recalculo
+        self._versao_input = None
+        self._manuais = {}
+
+    def _grade(self):
+        if self._versao_input != self._input.versao and \
+                time.monotonic() - self._input.alterada_em >= self.atraso_recalculo:
+            self._recalcular()
+        return self._linhas
+
+    def _recalcular(self):
+        hoje = self._hoje or date.today()
+        linhas = [[] for _ in range(LINHA_CABECALHO["output"] - 1)] + [list(CABECALHO_OUTPUT)]
+        entradas = [[_exibir(v) for v in l] for l in self._input._linhas[LINHA_CABECALHO["input"]:]
+                    if len(l) >= 3 and str(l[2]).strip() != ""]
+        calculadas = linhas_output(diagnosticar(quadro_input(entradas), hoje), len(CABECALHO_OUTPUT)) if entradas else []
+        for linha in calculadas:
+            for c, v in self._manuais.get(normalizar_id(linha[1]), {}).items():
+                linha[c] = v
+            self._atualizar_textos(linha)
+            linhas.append(linha)
+        self._linhas = linhas
+        self._versao_input = self._input.versao
+
+    @staticmethod
+    def _atualizar_textos(linha):
+        linha[27] = texto_boleto(linha[5], _exibir(linha[25]))
+        linha[39] = texto_boleto(linha[6], _exibir(linha[37]))
+
+    def _alterada(self):
+        # Guarda gatilhos e status por key, para sobreviverem ao próximo recálculo
+        for linha in self._linhas[LINHA_CABECALHO["output"]:]:
+            if len(linha) > 40:
+                self._manuais[normalizar_id(linha[1])] = {c: linha[c] for c in COLUNAS_MANUAIS_OUTPUT}
+                self._atualizar_textos(linha)
+        super()._alterada()
+
+    def _gravar(self, a1, valores):
+        self._grade()
+        super()._gravar(a1, valores)
+
+
+class BackendLocal:
+    """Planilha inteira em memória, com o OUTPUT calculado por `diagnostico`."""
+
+    def __init__(self, linhas_input=None, linhas_comm=None, hoje=None, atraso_recalculo=0.0):
+        lock = threading.RLock()
+        pad_in = [[] for _ in range(LINHA_CABECALHO["input"] - 1)] + [list(CABECALHO_INPUT)]
+        pad_comm = [list(CABECALHO_COMM)]
+        aba_input = AbaLocal(ABAS["input"], pad_in + list(linhas_input or []), lock=lock)
+        self.abas = {
+            "input": aba_input,
+            "output": AbaSaidaLocal(ABAS["output"], aba_input, hoje, atraso_recalculo, lock=lock),
+            "comm": AbaLocal(ABAS["comm"], pad_comm + list(linhas_comm or []), lock=lock),
+        }
+
+    def abrir(self, nome):
+        return self.abas[nome]
+
+    def estatisticas(self, zerar=False):
+        """Soma dos contadores de todas as abas (chamadas, linhas e bytes trafegados)."""
+        total = Counter()
+        for aba in self.abas.values():
+            total.update(aba.estatisticas)
+            if zerar:
+                aba.estatisticas.clear()
+        return dict(total)
+
+    @classmethod
+    def de_pasta(cls, pasta=None, **kwargs):
+        """Carrega input.csv e comunicacao.csv (sem cabeçalho, layout da planilha) de `pasta`."""
+        def ler(arquivo):
+            caminho = os.path.join(pasta, arquivo) if pasta else None
+            if not caminho or not os.path.exists(caminho):
+                return []
+            with open(caminho, newline='', encoding='utf-8') as f:
+                return list(csv.reader(f))
+        return cls(ler("input.csv"), ler("comunicacao.csv"), **kwargs)
+
+
+_backend_local_padrao = None
+
+
+def usar_backend_local(backend):
+    """Fixa a instância usada pelo app com BOLETOS_BACKEND=local (benchmarks e testes)."""
+    global _backend_local_padrao
+    _backend_local_padrao = backend
+
+
+def backend_local_padrao():
+    return _backend_local_padrao or BackendLocal.de_pasta(os.environ.get("BOLETOS_DADOS_LOCAIS"))
@@ -0,0 +1,67 @@
+"""Avisos de escrita entre sessões (publish/subscribe em memória, um por processo).
+
+Cada escrita feita pelas abas cacheadas publica a aba, as linhas e as keys
+tocadas. As sessões guardam o número do último evento que já viram e
+perguntam só pelo que veio depois; como o cache compartilhado já marcou essas
+linhas para recarga parcial, rodar a página de novo relê só elas.
+"""
+import itertools
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+MAX_EVENTOS = 1000
+
+Evento = namedtuple("Evento", "seq aba linhas chaves sessoes momento")
+
+_local = threading.local()
+
+
+@contextmanager
+def publicando_por(sessoes):
+    """Atribui às `sessoes` as escritas feitas neste thread (a sessão não recebe o próprio aviso)."""
+    anterior, _local.sessoes = getattr(_local, "sessoes", frozenset()), frozenset(sessoes)
+    try:
+        yield
+    finally:
+        _local.sessoes = anterior
+
+
+class Barramento:
+    """Fila circular de eventos de escrita; compartilhado via st.cache_resource."""
+
+    def __init__(self, max_eventos=MAX_EVENTOS):
+        self._eventos = deque(maxlen=max_eventos)
+        self._seq = itertools.count(1)
+        self._ultimo = 0
+        self._lock = threading.Lock()
+
+    def publicar(self, aba, linhas, chaves=None):
+        """`linhas`/`chaves` None: não se sabe o que mudou (vale para qualquer tela da aba)."""
+        with self._lock:
+            evento = Evento(next(self._seq), aba, None if linhas is None else frozenset(linhas),
+                            None if chaves is None else frozenset(chaves),
+                            getattr(_local, "sessoes", frozenset()), time.time())
+            self._eventos.append(evento)
+            self._ultimo = evento.seq
+            return evento.seq
+
+    def ultimo(self):
+        with self._lock:
+            return self._ultimo
+
+    def desde(self, seq, sessao=None):
+        """Eventos posteriores a `seq` de outras sessões; None se os mais antigos já saíram da fila."""
+        with self._lock:
+            if self._eventos and self._eventos[0].seq > seq + 1:
+                return None
+            return [e for e in self._eventos if e.seq > seq and sessao not in e.sessoes]
+
+
+def chaves_alteradas(eventos, chaves):
+    """Das `chaves` de uma tela, quantas foram tocadas pelos `eventos` (None: não dá para saber)."""
+    if eventos is None or any(e.chaves is None for e in eventos):
+        return None
+    tocadas = set().union(*(e.chaves for e in eventos)) if eventos else set()
+    return len(tocadas if chaves is None else tocadas & set(chaves))
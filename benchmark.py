@@ -0,0 +1,175 @@
+"""Benchmark das três páginas contra a planilha local, com squads sintéticos.
+
+Roda o main.py sem navegador (streamlit.testing.AppTest) sobre o BackendLocal e
+mede, por fluxo: tempo, chamadas ao backend, linhas e bytes trafegados e pico
+de memória. O resultado vai para um JSON, para comparar versões.
+
+    python benchmark.py                                  # squads de 50, 500 e 5.000
+    python benchmark.py --tamanhos 50 500 --saida bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+from backend import BackendLocal, usar_backend_local
+from conversao import formatar_moeda
+from fila_escritas import aguardar_filas
+
+TAMANHOS_PADRAO = (50, 500, 5000)
+LINHAS_POR_PAGINA = 50  # mesmo tamanho de página da grade do main.py
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+METODOS = ["Boleto", "PIX", "Cartão Pós", "Cartão Pré", "Sem Campanha"]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabi", "Hugo", "Íris", "João"]
+
+
+def gerar_dados(n_clientes, n_squads=3, semente=42):
+    """Gera linhas de INPUT e COMUNICACAO com `n_squads` squads de `n_clientes` cada.
+
+    O squad medido é o "SQUAD 01" (primeiro da lista da sidebar). Algumas keys
+    usam vírgula decimal no INPUT e ponto na COMUNICACAO, como na planilha real.
+    """
+    rnd = random.Random(semente)
+    linhas_input, linhas_comm = [], []
+    for s in range(n_squads):
+        squad = f"SQUAD {s + 1:02d}"
+        for i in range(n_clientes):
+            n = 1000 + s * n_clientes + i
+            key_in, key_comm = (f"{n},5", f"{n}.5") if rnd.random() < 0.05 else (str(n), str(n))
+            nome = f"Cliente {n} {rnd.choice(NOMES)}"
+            status = rnd.choices(["OK", "DUPLICADO", "INATIVO"], [90, 5, 5])[0]
+            verba_m = rnd.randrange(0, 200) * 100
+            verba_g = rnd.randrange(0, 100) * 100 if rnd.random() > 0.15 else 0
+            linhas_input.append(["", key_in, nome, status, rnd.choice(NOMES), squad,
+                                 formatar_moeda(verba_m), formatar_moeda(verba_g)])
+            contato = rnd.choice(NOMES)
+            email = f"{contato.lower()}.{n}@cliente.com.br" if rnd.random() < 0.9 else ""
+            fone = f"55119{rnd.randrange(10**7, 10**8)}" if rnd.random() < 0.85 else "-"
+            linhas_comm.append(["", key_comm, nome, "", "", "", contato, "", email, fone])
+    return linhas_input, linhas_comm
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(MAIN)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _medir(backend, fluxo, n_clientes, acao):
+    backend.estatisticas(zerar=True)
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    acao()
+    aguardar_filas()  # as escritas saem em segundo plano: o fluxo só termina quando a fila esvazia
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    est = backend.estatisticas()
+    resultado = {
+        "fluxo": fluxo,
+        "clientes": n_clientes,
+        "segundos": round(segundos, 4),
+        "chamadas": est.get("chamadas", 0),
+        "linhas": est.get("linhas", 0),
+        "bytes": est.get("bytes", 0),
+        "pico_memoria_mb": round(pico / 2**20, 2),
+        "chamadas_por_metodo": {k.split(":", 1)[1]: v for k, v in est.items() if k.startswith("chamadas:")},
+    }
+    print(f"  {fluxo:<22} {resultado['segundos']:>9.3f}s {resultado['chamadas']:>6} chamadas "
+          f"{resultado['linhas']:>8} linhas {resultado['bytes'] / 1024:>10.1f} KiB {resultado['pico_memoria_mb']:>8.1f} MiB")
+    return resultado
+
+
+def _verificar(at):
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return at
+
+
+def rodar_cenario(n_clientes, preenchidos=0.1, timeout=900):
+    """Executa os fluxos das três páginas para um squad de `n_clientes`."""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    backend = BackendLocal(*gerar_dados(n_clientes))
+    usar_backend_local(backend)
+    os.environ["BOLETOS_BACKEND"] = "local"
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+    at = AppTest.from_file(MAIN, default_timeout=timeout)
+    resultados = []
+    medir = lambda fluxo, acao: resultados.append(_medir(backend, fluxo, n_clientes, acao))
+
+    # Lançamento individual
+    medir("lancamento:carregar", lambda: _verificar(at.run()))
+    at.text_input(key="v2").input("1.500,00")
+    at.text_input(key="v4").input("50,00")
+    salvar = next(b for b in at.button if "SALVAR E GERAR" in b.label)
+    medir("lancamento:salvar", lambda: _verificar(salvar.click().run()))
+
+    # Atualização em massa (grade paginada; as edições são injetadas no estado do data_editor)
+    medir("massa:carregar", lambda: _verificar(at.sidebar.radio[0].set_value("🚀 Atualização em Massa").run()))
+    restantes = max(1, int(n_clientes * preenchidos))
+    for pagina in range(1, -(-restantes // LINHAS_POR_PAGINA) + 1):
+        if pagina > 1:
+            _verificar(at.number_input[0].set_value(pagina).run())
+        qtd = min(restantes, LINHAS_POR_PAGINA)
+        restantes -= qtd
+        grade = (f"grade_massa_SQUAD 01_{pagina}_0", {
+            "edited_rows": {i: {"Método Meta": "Boleto", "Crédito Meta": 1000.0, "Gasto Meta": 80.0} for i in range(qtd)},
+            "added_rows": [], "deleted_rows": []})
+        at.session_state[grade[0]] = grade[1]
+        _verificar(at.run())
+    # O AppTest não reenvia o estado do data_editor: a página visível é reinjetada no clique
+    at.session_state[grade[0]] = grade[1]
+    enviar = next(b for b in at.button if "ENVIAR" in b.label)
+    medir("massa:enviar", lambda: _verificar(enviar.click().run()))
+
+    # Dashboard
+    medir("dashboard:carregar", lambda: _verificar(at.sidebar.radio[0].set_value("📊 Dashboard Status").run()))
+    # Alguns status editados (o salvar grava só as células alteradas)
+    at.session_state["status_SQUAD 01"] = {
+        "edited_rows": {i: {"Status Meta": "EMITIDO"} for i in range(max(1, int(n_clientes * preenchidos)))},
+        "added_rows": [], "deleted_rows": []}
+    salvar_status = next(b for b in at.button if "SALVAR STATUS" in b.label)
+    medir("dashboard:salvar", lambda: _verificar(salvar_status.click().run()))
+    filtro = next(s for s in at.sidebar.selectbox if "Dashboard" in s.label)
+    medir("dashboard:todos", lambda: _verificar(filtro.set_value(filtro.options[0]).run()))
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS_PADRAO),
+                        help="clientes por squad em cada cenário")
+    parser.add_argument("--preenchidos", type=float, default=0.1,
+                        help="fração do squad preenchida no envio em massa (padrão 0.1)")
+    parser.add_argument("--saida", default="bench_resultados.json", help="arquivo JSON de resultados")
+    args = parser.parse_args()
+
+    resultados = []
+    for n in args.tamanhos:
+        print(f"Squad de {n} clientes")
+        resultados.extend(rodar_cenario(n, args.preenchidos))
+
+    relatorio = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "resultados": resultados,
+    }
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"Resultados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Cards de resultado e links de comunicação (WhatsApp/Gmail) dos clientes.
+
+Os cards de uma execução são montados numa única passada de template e
+entregues em poucos blocos de HTML (um st.markdown por bloco). Os links são
+memorizados pelo conteúdo da linha da COMUNICACAO e pelo mês de referência:
+só são refeitos quando o contato muda ou o mês vira.
+"""
+import functools
+import html
+import urllib.parse
+from datetime import datetime
+
+CC_FINANCEIRO = "financeiro@comodoplanejados.com.br"
+CARDS_POR_BLOCO = 250
+
+TEXTO_WHATSAPP = (
+    "Olá, {contato}!\n\n"
+    "Foram enviados no e-mail {email}, os boletos das plataformas de anúncios.\n\n"
+    "*Observações importantes:*\n"
+    "1. Não conseguimos alterar a data de vencimento dos boletos.\n"
+    "2. *De maneira alguma, realize o pagamento de boletos vencidos.*\n\n"
+    "Qualquer dúvida, estou à disposição!"
+)
+CORPO_EMAIL = (
+    "Olá,\n\n"
+    "Envio anexos os boletos referentes às plataformas de mídia paga.\n\n"
+    "Observações importantes:\n"
+    "1. Não é possível editar a data de vencimento do boleto gerado na plataforma e, por isto, pedimos para que o pagamento seja feito o mais rápido possível.\n"
+    "2. De maneira alguma, realize o pagamento de boletos vencidos, sob pena de perder o valor adicionado indefinidamente.\n\n"
+    "Ficamos à disposição para quaisquer esclarecimentos.\n\n"
+    "Obrigada!\n\n"
+    "Atenciosamente,"
+)
+
+# Templates em uma linha só: linhas em branco encerrariam o bloco HTML do markdown
+MODELO_CHECK = "<div class='mass-check-box {classe}'>{nome}<br>{valor}{diff}</div>"
+MODELO_DIFF = "<div style='font-size:0.65em; margin-top:3px; line-height:1.1; opacity:0.9;'>{}</div>"
+MODELO_WHATSAPP = ("<a href='{}' target='_blank' style='text-decoration:none; flex:1;'><button style='background-color:#238636;"
+                   "color:white;border:none;padding:12px;border-radius:6px;width:100%;cursor:pointer;font-weight:bold;"
+                   "margin-right:5px;'>WhatsApp</button></a>")
+MODELO_GMAIL = ("<a href='{}' target='_blank' style='text-decoration:none; flex:1;'><button style='background-color:#cf222e;"
+                "color:white;border:none;padding:12px;border-radius:6px;width:100%;cursor:pointer;font-weight:bold;"
+                "margin-left:5px;'>Gmail</button></a>")
+MODELO_CARD = (
+    "<div class=\"mass-card\"><div class=\"mass-title\">{nome}</div>"
+    "<div style=\"font-size:0.8em; margin-bottom:5px; color:#aaa;\">📊 Auditoria de Cheques</div>"
+    "<div class=\"mass-checks-grid\">{checks}</div>"
+    "<div class=\"mass-values\">"
+    "<div class=\"mass-val-col\"><div class=\"mass-label\">Meta Ads</div><div class=\"mass-money\">R$ {val_meta}</div>"
+    "<div class=\"mass-boleto\">{txt_meta}</div></div>"
+    "<div style=\"border-left:1px solid #30363d;\"></div>"
+    "<div class=\"mass-val-col\"><div class=\"mass-label\">Google Ads</div><div class=\"mass-money\">R$ {val_google}</div>"
+    "<div class=\"mass-boleto\">{txt_google}</div></div>"
+    "</div>"
+    "<div style=\"display:flex; justify-content:space-between;\">{botoes}</div></div>"
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def links_comunicacao(cliente, contato, email, telefone, referencia):
+    """(link do WhatsApp, link do Gmail) de uma linha da COMUNICACAO; None quando falta o dado."""
+    wpp = gmail = None
+    if telefone and telefone not in ("-", "0"):
+        wpp = f"https://wa.me/{telefone}?text={urllib.parse.quote(TEXTO_WHATSAPP.format(contato=contato, email=email))}"
+    if email and "@" in email:
+        params = {"view": "cm", "fs": "1", "to": email, "cc": CC_FINANCEIRO,
+                  "su": f"Boleto Anúncios - {cliente} | Ref. {referencia}", "body": CORPO_EMAIL}
+        gmail = f"https://mail.google.com/mail/?{urllib.parse.urlencode(params, quote_via=urllib.parse.quote)}"
+    return wpp, gmail
+
+
+def links_do_registro(registro, agora=None):
+    """Links a partir de um registro de comm_contatos (Cliente, Contato, E-mail, Telefone)."""
+    if not registro:
+        return None, None
+    g = lambda c: str(registro.get(c, "")).strip()
+    referencia = (agora or datetime.now()).strftime("%m - %Y")
+    return links_comunicacao(g("Cliente"), g("Contato"), g("E-mail"), g("Telefone"), referencia)
+
+
+def _ok(valor):
+    return str(valor).strip().upper() == "OK"
+
+
+def _checks(linha):
+    g = lambda i: linha[i] if i < len(linha) else ""
+    partes = []
+    for nome, valor, diff, vazio_ok in (
+        ("FB", g(8), "", True),
+        ("GL", g(9), "", True),
+        ("Mídia", g(12), f"Acordado: {g(10)}<br>Lançado: {g(11)}", False),
+        ("Emissão", g(15), f"Acordado: {g(13)}<br>Soma: {g(14)}", False),
+        ("Meta", g(17), "Saldo baixo", False),
+        ("Google", g(19), "Saldo baixo", False),
+    ):
+        # Check 1 vazio é plataforma não contratada: conta como OK
+        ok = _ok(valor) or (vazio_ok and str(valor).strip() == "")
+        partes.append(MODELO_CHECK.format(classe="check-ok" if ok else "check-nok", nome=nome, valor=valor,
+                                          diff="" if ok or vazio_ok else MODELO_DIFF.format(diff)))
+    return "".join(partes)
+
+
+def html_card(nome, linha, links):
+    """Card de um cliente; `linha` no layout do OUTPUT, `links` de `links_do_registro`."""
+    g = lambda i: linha[i] if i < len(linha) else ""
+    wpp, gmail = links
+    return MODELO_CARD.format(
+        nome=html.escape(str(nome)), checks=_checks(linha),
+        val_meta=str(g(24)).replace("R$", "").strip(), val_google=str(g(36)).replace("R$", "").strip(),
+        txt_meta=g(27) or "Sem Boleto", txt_google=g(39) or "Sem Boleto",
+        botoes=(MODELO_WHATSAPP.format(wpp) if wpp else "") + (MODELO_GMAIL.format(gmail) if gmail else ""))
+
+
+def montar_cards(itens, por_bloco=CARDS_POR_BLOCO, agora=None):
+    """HTML dos cards de [(nome, linha do OUTPUT, registro da COMUNICACAO)], em blocos de `por_bloco`."""
+    agora = agora or datetime.now()
+    cards = [html_card(nome, linha, links_do_registro(registro, agora)) for nome, linha, registro in itens]
+    return ["\n".join(cards[i:i + por_bloco]) for i in range(0, len(cards), por_bloco)]
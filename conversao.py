@@ -0,0 +1,87 @@
+"""Conversão de valores no formato brasileiro da planilha.
+
+As funções escalares servem a um valor avulso; as de série convertem uma
+coluna inteira de uma vez e devolvem, junto do resultado, a máscara de
+valores válidos, para que texto malformado seja rejeitado em vez de virar 0.
+"""
+import pandas as pd
+
+# "R$ 1.500,00", "1500", "-10,5"; ponto só como separador de milhar
+PADRAO_MOEDA = r"-?(?:\d{1,3}(?:\.\d{3})+|\d+)(?:,\d+)?"
+# "DD/MM", aceitando um ano no fim ("DD/MM/AA" ou "DD/MM/AAAA"), que precisa ser o ano informado
+PADRAO_DATA = r"(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?"
+
+
+def normalizar_id(valor):
+    return str(valor).replace(',', '.').strip()
+
+def limpar_valor_monetario(texto):
+    if not texto: return 0
+    if isinstance(texto, (int, float)): return float(texto)
+    limpo = str(texto).replace('R$', '').replace('.', '').replace(',', '.').strip()
+    try: return float(limpo)
+    except ValueError: return 0
+
+def formatar_moeda(valor):
+    """1500.5 -> '1.500,50' (formato de exibição da planilha, sem o R$)."""
+    return f"{valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def _texto(serie):
+    return serie.astype(object).fillna("").astype(str).str.strip()
+
+def normalizar_ids(serie):
+    """Versão vetorizada de normalizar_id."""
+    return _texto(serie).str.replace(',', '.', regex=False)
+
+def converter_moeda(serie, negativos=True):
+    """Texto pt-BR -> (floats, válidos). Vazio vale 0.0; texto fora do padrão vira NaN.
+
+    Colunas já numéricas passam direto (NaN conta como vazio). Com
+    `negativos=False`, valores abaixo de zero também são inválidos.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        numeros = serie.astype(float).fillna(0.0)
+        return numeros, (numeros >= 0) if not negativos else pd.Series(True, index=serie.index)
+    texto = _texto(serie).str.replace('R$', '', regex=False).str.replace(' ', '', regex=False)
+    vazio = texto == ""
+    validos = vazio | texto.str.fullmatch(PADRAO_MOEDA)
+    if not negativos:
+        validos &= ~texto.str.startswith('-')
+    numeros = pd.to_numeric(texto.where(validos & ~vazio).str.replace('.', '', regex=False)
+                            .str.replace(',', '.', regex=False), errors='coerce')
+    return numeros.mask(vazio, 0.0), validos
+
+def converter_data(serie, ano):
+    """'DD/MM' -> (datas no `ano`, válidos). Vazio vira NaT e é válido; 31/02 ou texto solto não.
+
+    Um ano digitado ('05/03/2024') precisa ser o `ano`; outro ano é inválido em vez de trocado.
+    """
+    texto = _texto(serie)
+    partes = texto.str.extract(f"^{PADRAO_DATA}$")
+    digitado = pd.to_numeric(partes[2])
+    outro_ano = digitado.notna() & (digitado != ano) & (digitado != ano % 100)
+    datas = pd.to_datetime(pd.DataFrame({"year": ano, "month": pd.to_numeric(partes[1]),
+                                         "day": pd.to_numeric(partes[0])}, index=serie.index), errors="coerce")
+    datas = datas.mask(outro_ano)
+    return datas, (texto == "") | datas.notna()
+
+def serie_monetaria(serie):
+    """Coluna monetária como float, com vazio e inválido valendo 0 (snapshots e exibição)."""
+    return converter_moeda(serie)[0].fillna(0.0)
+
+def converter_colunas(df, moedas=(), datas=(), ano=None, negativos=True):
+    """Converte de uma vez as colunas `moedas` (float) e `datas` (datetime) de `df`.
+
+    `negativos=False` rejeita valores monetários abaixo de zero. Retorna (df convertido, máscara das linhas sem erro, erros); `erros` tem uma
+    linha por célula rejeitada, com o índice da linha, a coluna e o texto original.
+    """
+    ano = ano or pd.Timestamp.today().year
+    convertido, validas, erros = df.copy(), pd.Series(True, index=df.index), []
+    for nome in list(moedas) + list(datas):
+        valores, ok = converter_moeda(df[nome], negativos) if nome in moedas else converter_data(df[nome], ano)
+        convertido[nome] = valores
+        validas &= ok
+        erros.append(pd.DataFrame({"linha": df.index[~ok], "coluna": nome, "valor": df.loc[~ok, nome].values}))
+    erros = pd.concat(erros, ignore_index=True) if erros else pd.DataFrame(columns=["linha", "coluna", "valor"])
+    return convertido, validas, erros
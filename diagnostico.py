@@ -0,0 +1,182 @@
+"""Regras dos checks do OUTPUT (checks 1–4 e valores "A Emitir").
+
+Reproduz, em pandas, o que as fórmulas da aba OUTPUT calculam a partir do
+INPUT, para um squad inteiro de uma vez. Colunas do INPUT usadas (0-based):
+B(1) Key, C(2) Clientes, D(3) Status, F(5) SQUAD, G(6)/H(7) verba mensal
+acordada Meta/Google e I:P(8–15) os dados lançados (método, crédito, data do
+saldo e gasto diário de Meta e depois de Google).
+
+O resultado é uma prévia para a tela e uma conferência: os gatilhos Z/AL
+gravados vêm do OUTPUT recalculado pela planilha (ver fila_escritas).
+"""
+import calendar
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from conversao import converter_colunas, converter_data, limpar_valor_monetario, formatar_moeda, serie_monetaria
+
+METODOS_PRE_PAGOS = ("Boleto", "PIX")
+TOLERANCIA = 0.10  # 10% de folga sobre o acordado nos checks 2 e 3
+DIA_LIMITE = 10
+LARGURA_OUTPUT = 41  # colunas A:AO do OUTPUT
+
+# Campos lançados em I:P, na ordem das colunas
+CAMPOS_LANCAMENTO = ["Método Meta", "Crédito Meta", "Data Saldo Meta", "Gasto Diário Meta",
+                     "Método Google", "Crédito Google", "Data Saldo Google", "Gasto Diário Google"]
+CAMPOS_MOEDA = [c for c in CAMPOS_LANCAMENTO if c.startswith(("Crédito", "Gasto"))]
+CAMPOS_DATA = [c for c in CAMPOS_LANCAMENTO if c.startswith("Data")]
+COLUNAS_INPUT = {"Key": 1, "Clientes": 2, "Status": 3, "SQUAD": 5, "Verba Meta": 6, "Verba Google": 7,
+                 **{nome: 8 + i for i, nome in enumerate(CAMPOS_LANCAMENTO)}}
+# Coluna do OUTPUT (0-based) de cada resultado de `diagnosticar`
+COLUNAS_OUTPUT = {"Key": 1, "Clientes": 2, "Status": 3, "SQUAD": 4, "Método Meta": 5, "Método Google": 6,
+                  "Check 1 FB": 8, "Check 1 GL": 9, "Acordado Mídia": 10, "Lançado Mídia": 11, "Check 2": 12,
+                  "Acordado Emissão": 13, "Soma Emissão": 14, "Check 3": 15,
+                  "Dias Saldo Meta": 16, "Check 4 Meta": 17, "Dias Saldo Google": 18, "Check 4 Google": 19,
+                  "Crédito Meta": 20, "Gasto Diário Meta": 21, "Crédito Google": 22, "Gasto Diário Google": 23,
+                  "A Emitir Meta": 24, "A Emitir Google": 36}
+COLUNAS_CHECK = {nome: c for nome, c in COLUNAS_OUTPUT.items() if nome.startswith("Check")}
+
+
+def data_limite(hoje):
+    """Dia 10 do mês seguinte: até quando o saldo precisa durar."""
+    ano, mes = (hoje.year + 1, 1) if hoje.month == 12 else (hoje.year, hoje.month + 1)
+    return date(ano, mes, DIA_LIMITE)
+
+
+def serie_data_saldo(serie, hoje):
+    """'DD/MM' -> data no ano corrente; vazio ou inválido -> hoje."""
+    return converter_data(serie, hoje.year)[0].fillna(pd.Timestamp(hoje))
+
+
+def _texto(serie):
+    return serie.astype(object).fillna("").astype(str).str.strip()
+
+
+def _plataforma(metodo, verba, credito, data_saldo, gasto, hoje):
+    """Check 1, dias de saldo, check 4 e valor a emitir de uma plataforma."""
+    check1 = np.select([(verba > 0) & (metodo == ""), verba > 0,
+                        (metodo != "") & (metodo != "Sem Campanha") & (gasto > 0)],
+                       ["SEM MÉTODO", "OK", "SEM VERBA"], "")  # vazio: plataforma não contratada, conta como OK
+
+    dias = (pd.Timestamp(data_limite(hoje)) - serie_data_saldo(data_saldo, hoje)).dt.days.clip(lower=0)
+    pre_pago = metodo.isin(METODOS_PRE_PAGOS)
+    necessidade = gasto * dias
+    a_emitir = (necessidade - credito).clip(lower=0).round(2).where(pre_pago, 0.0)
+    # pós-pago/cartão/sem campanha não dependem de saldo
+    check4 = np.where(pre_pago & (credito < necessidade), "NOK", "OK")
+    com_gasto = pre_pago & (gasto > 0)
+    dias_saldo = (credito // gasto.where(com_gasto)).astype("Int64").astype(object).where(com_gasto, "")
+    return check1, dias_saldo, check4, a_emitir
+
+
+def diagnosticar(df, hoje=None):
+    """Calcula as colunas de fórmula do OUTPUT para todas as linhas de `df`.
+
+    `df` tem as colunas de COLUNAS_INPUT (valores monetários em texto pt-BR ou
+    já numéricos). Retorna um DataFrame com o mesmo índice e as colunas de
+    COLUNAS_OUTPUT; valores monetários saem como float e são formatados por
+    quem exibe.
+    """
+    hoje = hoje or date.today()
+    t = {c: _texto(df[c]) for c in ("Key", "Clientes", "Status", "SQUAD", "Método Meta", "Método Google",
+                                    "Data Saldo Meta", "Data Saldo Google")}
+    n = {c: serie_monetaria(df[c]) for c in ("Verba Meta", "Verba Google", "Crédito Meta", "Gasto Diário Meta",
+                                      "Crédito Google", "Gasto Diário Google")}
+
+    c1_m, dias_m, c4_m, emitir_m = _plataforma(t["Método Meta"], n["Verba Meta"], n["Crédito Meta"],
+                                               t["Data Saldo Meta"], n["Gasto Diário Meta"], hoje)
+    c1_g, dias_g, c4_g, emitir_g = _plataforma(t["Método Google"], n["Verba Google"], n["Crédito Google"],
+                                               t["Data Saldo Google"], n["Gasto Diário Google"], hoje)
+
+    acordado = n["Verba Meta"] + n["Verba Google"]
+    lancado = (n["Gasto Diário Meta"] + n["Gasto Diário Google"]) * calendar.monthrange(hoje.year, hoje.month)[1]
+    soma = n["Crédito Meta"] + n["Crédito Google"] + emitir_m + emitir_g
+
+    return pd.DataFrame({
+        "Key": t["Key"], "Clientes": t["Clientes"], "Status": t["Status"], "SQUAD": t["SQUAD"],
+        "Método Meta": t["Método Meta"], "Método Google": t["Método Google"],
+        "Check 1 FB": c1_m, "Check 1 GL": c1_g,
+        "Acordado Mídia": acordado, "Lançado Mídia": lancado,
+        "Check 2": np.where((lancado - acordado).abs() <= acordado * TOLERANCIA, "OK", "NOK"),
+        "Acordado Emissão": acordado, "Soma Emissão": soma,
+        "Check 3": np.where(soma <= acordado * (1 + TOLERANCIA), "OK", "NOK"),
+        "Dias Saldo Meta": dias_m, "Check 4 Meta": c4_m, "Dias Saldo Google": dias_g, "Check 4 Google": c4_g,
+        "Crédito Meta": n["Crédito Meta"], "Gasto Diário Meta": n["Gasto Diário Meta"],
+        "Crédito Google": n["Crédito Google"], "Gasto Diário Google": n["Gasto Diário Google"],
+        "A Emitir Meta": emitir_m, "A Emitir Google": emitir_g,
+    }, index=df.index)
+
+
+def converter_lancamentos(brutos, ano=None):
+    """Valida e converte o texto digitado em I:P (DataFrame com CAMPOS_LANCAMENTO).
+
+    Retorna (valores de I:P por linha, prontos para gravar, máscara das linhas
+    válidas, erros de `converter_colunas`). As datas seguem como texto DD/MM;
+    valores negativos e datas de outro ano são rejeitados.
+    """
+    brutos = brutos[CAMPOS_LANCAMENTO].apply(lambda s: s if pd.api.types.is_numeric_dtype(s) else _texto(s))
+    convertido, validas, erros = converter_colunas(brutos, moedas=CAMPOS_MOEDA, datas=CAMPOS_DATA, ano=ano,
+                                                 negativos=False)
+    convertido[CAMPOS_DATA] = brutos[CAMPOS_DATA]
+    return convertido.values.tolist(), validas, erros
+
+
+def quadro_input(linhas):
+    """DataFrame com as colunas de COLUNAS_INPUT a partir de linhas cruas do INPUT."""
+    largura = max(COLUNAS_INPUT.values()) + 1
+    grade = pd.DataFrame([list(l[:largura]) + [""] * (largura - len(l)) for l in linhas],
+                         columns=range(largura), dtype=object)
+    return pd.DataFrame({nome: grade[col] for nome, col in COLUNAS_INPUT.items()})
+
+
+def linhas_output(diag, largura):
+    """Linhas no layout do OUTPUT (listas de `largura` colunas) a partir de `diagnosticar`."""
+    colunas = list(COLUNAS_OUTPUT.values())
+    linhas = []
+    for valores in diag[list(COLUNAS_OUTPUT)].itertuples(index=False):
+        linha = [""] * largura
+        for c, v in zip(colunas, valores):
+            linha[c] = v
+        linhas.append(linha)
+    return linhas
+
+
+def diagnosticar_entradas(df_clientes, entradas, hoje=None):
+    """Diagnóstico das linhas lançadas (`entradas` com 'linha' e 'valores' de I:P).
+
+    `df_clientes` é a projeção input_clientes (uma linha por `_linha` do INPUT).
+    """
+    base = df_clientes.set_index("_linha").loc[[e['linha'] for e in entradas]]
+    lancados = pd.DataFrame([e['valores'] for e in entradas], columns=CAMPOS_LANCAMENTO, index=base.index)
+    return diagnosticar(base.join(lancados), hoje)
+
+
+def valores_a_emitir(diag):
+    """(Meta, Google) a emitir de cada linha de `diagnosticar`, na ordem do DataFrame."""
+    return list(zip(diag["A Emitir Meta"].astype(float), diag["A Emitir Google"].astype(float)))
+
+
+def checks_esperados(diag):
+    """{check: texto} de cada linha de `diagnosticar` (ver COLUNAS_CHECK), na ordem do DataFrame."""
+    return [dict(zip(COLUNAS_CHECK, valores)) for valores in zip(*(diag[c].astype(str) for c in COLUNAS_CHECK))]
+
+
+def linhas_resultado(diag):
+    """Linhas no layout do OUTPUT, como a planilha exibiria depois de gravar os gatilhos Z/AL."""
+    linhas = []
+    for linha in linhas_output(diag, LARGURA_OUTPUT):
+        linha[25], linha[37] = linha[24], linha[36]
+        linha[27] = texto_boleto(linha[5], formatar_moeda(linha[24]))
+        linha[39] = texto_boleto(linha[6], formatar_moeda(linha[36]))
+        linhas.append([formatar_moeda(v) if isinstance(v, float) else v for v in linha])
+    return linhas
+
+
+def texto_boleto(metodo, valor_emitido):
+    """Colunas AB/AN: descrevem o boleto a partir do valor gravado no gatilho (Z/AL)."""
+    valor = limpar_valor_monetario(valor_emitido)
+    if valor <= 0 or metodo not in METODOS_PRE_PAGOS:
+        return ""
+    return f"{metodo} de R$ {formatar_moeda(valor)}"
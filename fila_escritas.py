@@ -0,0 +1,366 @@
+"""Fila de escritas em segundo plano, compartilhada por todas as sessões.
+
+Salvar não prende mais a sessão do operador: a página enfileira um trabalho
+(escritas em uma ou mais abas) e segue para o próximo cliente. Um único
+thread grava os trabalhos pendentes:
+- junta tudo o que está na fila num batch_update por aba, e num mesmo range
+  vale a escrita mais recente;
+- repete com espera exponencial (com jitter) em 429, 5xx e falhas de rede,
+  avisando o `Monitor` de cada repetição;
+- guarda o estado de cada trabalho, que a interface consulta.
+
+Os lançamentos miram linhas tiradas de uma projeção em cache, que pode ter
+até um TTL de idade. Antes de gravar, o thread relê a key (coluna B) de cada
+linha de destino no INPUT e no OUTPUT; se alguma não bater (linhas inseridas
+ou apagadas nesse meio-tempo), o trabalho falha sem escrever nada.
+
+Os gatilhos Z/AL dos lançamentos não vêm do cálculo local: gravado o I:P, o
+thread espera a planilha recalcular, lê as linhas do OUTPUT e copia para Z/AL
+o A Emitir (Y/AK) da própria planilha, como o app sempre fez. Na mesma
+leitura ficam guardados os checks 1–4 do OUTPUT. O cálculo local (`esperado`
+e `checks`) só serve de conferência: cada divergência vira um aviso no
+trabalho e entra na contagem de `paridade()`.
+"""
+import itertools
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from barramento import publicando_por
+from conversao import formatar_moeda, limpar_valor_monetario, normalizar_id
+from diagnostico import COLUNAS_CHECK
+from limitador import segundo_plano
+from planilha import ColetorCelulas, aguardar_recalculo, ler_linhas, mesmos_valores
+
+NA_FILA, GRAVANDO, CONCLUIDO, ERRO = "na fila", "gravando", "concluído", "erro"
+MAX_TRABALHOS = 500  # histórico de estados guardado (saem os terminados mais antigos)
+PRAZO_RECALCULO = 12  # segundos esperando o OUTPUT refletir o INPUT gravado
+COLUNAS_GATILHO = ((24, 26), (36, 38))  # A Emitir Y/AK (0-based) -> gatilho Z/AL (1-based)
+
+_filas = weakref.WeakSet()
+
+
+def erro_repetivel(erro):
+    """429, 5xx e falhas de conexão merecem nova tentativa; o resto falha o trabalho."""
+    codigo = getattr(erro, "code", None) or getattr(getattr(erro, "response", None), "status_code", None)
+    if isinstance(codigo, int) and codigo > 0:
+        return codigo == 429 or 500 <= codigo < 600
+    # requests.ConnectionError/Timeout herdam de OSError
+    return isinstance(erro, OSError)
+
+
+def agrupar_escritas(trabalhos):
+    """{(aba, value_input_option): (data, ids dos trabalhos)} na ordem de chegada.
+
+    Um range repetido fica só com a escrita mais recente, na posição dela, para
+    que sobreposições parciais continuem sendo aplicadas na ordem certa.
+    """
+    grupos = OrderedDict()
+    for t in trabalhos:
+        for nome, data, opcao in t.escritas:
+            destino, ids = grupos.setdefault((nome, opcao), (OrderedDict(), set()))
+            ids.add(t.id)
+            for item in data:
+                destino.pop(item["range"], None)
+                destino[item["range"]] = item
+    return OrderedDict((k, (list(d.values()), ids)) for k, (d, ids) in grupos.items())
+
+
+class Trabalho:
+    def __init__(self, id, escritas, descricao, sessao, lancamentos=()):
+        self.id = id
+        self.escritas = escritas  # [(nome da aba, data do batch_update, value_input_option)]
+        self.lancamentos = list(lancamentos)  # [{key, linha_in, linha_out, esperado, checks}] conferidos antes de gravar
+        self.descricao = descricao
+        self.sessao = sessao
+        self.estado = NA_FILA
+        self.tentativas = 0
+        self.erro = None
+        self.criado_em = time.time()
+        self.concluido_em = None
+        self.celulas = sum(len(v) for _, data, _ in escritas for d in data for v in d["values"])
+        self.gatilhos = {}  # key -> (meta, google) gravados em Z/AL, lidos do OUTPUT
+        self.checks = {}  # key -> {check: valor} do OUTPUT, lidos junto com os gatilhos
+        self.avisos = []
+        self.espera_recalculo = None
+        self.ao_concluir = None
+
+    def resumo(self):
+        return {"id": self.id, "descricao": self.descricao, "estado": self.estado, "tentativas": self.tentativas,
+                "erro": self.erro, "criado_em": self.criado_em, "concluido_em": self.concluido_em,
+                "celulas": self.celulas, "gatilhos": dict(self.gatilhos), "checks": dict(self.checks), "avisos": list(self.avisos),
+                "espera_recalculo": self.espera_recalculo}
+
+
+class FilaEscritas:
+    """Grava em segundo plano nas `abas` ({nome: worksheet}); compartilhada via st.cache_resource."""
+
+    def __init__(self, abas, monitor=None, max_tentativas=6, espera_inicial=1.0, espera_max=32.0,
+                 prazo_recalculo=PRAZO_RECALCULO):
+        self._abas = abas
+        self._monitor = monitor
+        self.max_tentativas = max_tentativas
+        self.espera_inicial = espera_inicial
+        self.espera_max = espera_max
+        self.prazo_recalculo = prazo_recalculo
+        self._paridade = {"comparados": 0, "divergentes": 0, "checks_divergentes": 0}
+        self._cond = threading.Condition()
+        self._pendentes = []
+        self._gravando = 0
+        self._trabalhos = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lotes = itertools.count(1)
+        threading.Thread(target=self._executar, name="fila-escritas", daemon=True).start()
+        _filas.add(self)
+
+    # --- para as páginas ---
+    def enfileirar(self, escritas, descricao="", sessao=None, value_input_option='USER_ENTERED', lancamentos=(),
+                   ao_concluir=None):
+        """Enfileira [(nome da aba, data do batch_update)] como um trabalho e retorna o id.
+
+        `lancamentos` ({key normalizada, linha_in, linha_out, esperado, checks})
+        são as linhas cuja key é conferida antes de gravar; com linha_out (None
+        se a key não está no OUTPUT), o trabalho também grava os gatilhos Z/AL, e
+        `esperado` ((meta, google)) e `checks` ({check: valor}) do cálculo local
+        são comparados com a planilha.
+        `ao_concluir(resumo)` roda no thread da fila quando o trabalho termina
+        sem erro (ex.: gravar o histórico só do que foi de fato gravado).
+        """
+        escritas = [(nome, data, value_input_option) for nome, data in escritas if data]
+        with self._cond:
+            t = Trabalho(next(self._ids), escritas, descricao, sessao, lancamentos)
+            t.ao_concluir = ao_concluir
+            self._trabalhos[t.id] = t
+            self._descartar_terminados()
+            if escritas or t.lancamentos:
+                self._pendentes.append(t)
+                self._cond.notify()
+            else:
+                t.estado, t.concluido_em = CONCLUIDO, time.time()
+            return t.id
+
+    def _descartar_terminados(self):
+        # Passando do limite, esquece os trabalhos já terminados, do mais antigo ao mais novo;
+        # os que estão na fila ou gravando ficam sempre
+        excesso = len(self._trabalhos) - MAX_TRABALHOS
+        if excesso > 0:
+            terminados = [id for id, t in self._trabalhos.items() if t.estado in (CONCLUIDO, ERRO)]
+            for id in terminados[:excesso]:
+                del self._trabalhos[id]
+
+    def reenviar(self, id):
+        """Põe de volta na fila um trabalho que terminou em erro."""
+        with self._cond:
+            t = self._trabalhos.get(id)
+            if t and t.estado == ERRO:
+                t.estado, t.erro, t.tentativas = NA_FILA, None, 0
+                self._pendentes.append(t)
+                self._cond.notify()
+
+    def trabalho(self, id):
+        with self._cond:
+            t = self._trabalhos.get(id)
+            return t.resumo() if t else None
+
+    def trabalhos(self, sessao=None, limite=20):
+        """Estados dos trabalhos (da `sessao`, se informada), do mais recente ao mais antigo."""
+        with self._cond:
+            selecionados = [t for t in reversed(self._trabalhos.values()) if sessao is None or t.sessao == sessao]
+            return [t.resumo() for t in selecionados[:limite]]
+
+    def paridade(self):
+        """Gatilhos conferidos e quantos tinham o A Emitir ou os checks da planilha diferentes do cálculo local."""
+        with self._cond:
+            return dict(self._paridade)
+
+    def aguardar(self, timeout=None):
+        """Bloqueia até a fila esvaziar; retorna False se o `timeout` acabar antes."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pendentes or self._gravando:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante)
+        return True
+
+    # --- thread de escrita ---
+    def _executar(self):
+        while True:
+            with self._cond:
+                while not self._pendentes:
+                    self._cond.wait()
+                lote, self._pendentes = self._pendentes, []
+                self._gravando = len(lote)
+                for t in lote:
+                    t.estado = GRAVANDO
+            try:
+                # Gatilhos e lotes de fundo cedem a vez às requisições da interface;
+                # o aviso de escrita não volta para as sessões que a pediram
+                with segundo_plano(), publicando_por({t.sessao for t in lote}):
+                    self._gravar(lote)
+            except Exception as e:
+                self._finalizar(lote, f"{type(e).__name__}: {e}")
+            with self._cond:
+                self._gravando = 0
+                self._cond.notify_all()
+
+    def _gravar(self, lote):
+        if self._monitor:
+            self._monitor.iniciar_execucao("fila-escritas", next(self._lotes), "fila")
+        lote, lidas = self._conferir_chaves(lote)
+        alteradas = self._linhas_alteradas(lote, lidas)
+        falhas = {}
+        for (nome, opcao), (data, ids) in agrupar_escritas(lote).items():
+            _, erro = self._com_repeticao(lambda: self._abas[nome].batch_update(data, value_input_option=opcao), lote, ids)
+            if erro:
+                for i in ids:
+                    falhas.setdefault(i, (erro, set()))[1].add((nome, opcao))
+        for t in lote:
+            # Um reenvio só repete o que falhou; o resto já está gravado
+            grupos = falhas.get(t.id, (None, ()))[1]
+            t.escritas = [e for e in t.escritas if (e[0], e[2]) in grupos]
+        erros_gatilho = self._gravar_gatilhos([t for t in lote if t.id not in falhas], lidas.get("output", {}), alteradas)
+        for t in lote:
+            self._finalizar([t], falhas.get(t.id, (None,))[0] or erros_gatilho.get(t.id))
+
+    def _conferir_chaves(self, lote):
+        # Uma leitura por aba: B:P do INPUT e as linhas inteiras do OUTPUT, como estão antes
+        # da escrita. Devolve os trabalhos que podem seguir e {aba: {linha: valores lidos}}.
+        lancamentos = [l for t in lote for l in t.lancamentos]
+        if not lancamentos:
+            return lote, {}
+        ids = {t.id for t in lote if t.lancamentos}
+        lidas, erro = {}, None
+        for nome, campo, primeira, ultima in (("input", "linha_in", 2, 16), ("output", "linha_out", 1, 41)):
+            linhas = sorted({l[campo] for l in lancamentos if l[campo]})
+            valores, erro = self._com_repeticao(lambda: ler_linhas(self._abas[nome], linhas, ultima, primeira), lote, ids)
+            if erro:
+                break
+            lidas[nome] = dict(zip(linhas, valores))
+        chave = lambda nome, linha, col: normalizar_id(lidas[nome][linha][col]) if len(lidas[nome][linha]) > col else ""
+        seguem = []
+        for t in lote:
+            erradas = [] if erro else [l["key"] for l in t.lancamentos
+                                       if chave("input", l["linha_in"], 0) != l["key"]
+                                       or (l["linha_out"] and chave("output", l["linha_out"], 1) != l["key"])]
+            if t.id in ids and (erro or erradas):
+                self._finalizar([t], erro or "A planilha mudou desde a última leitura: key fora da linha esperada ("
+                                + ", ".join(erradas[:5]) + (", ..." if len(erradas) > 5 else "")
+                                + "). Atualize a página e envie de novo.")
+            else:
+                seguem.append(t)
+        return seguem, lidas
+
+    def _linhas_alteradas(self, lote, lidas):
+        # Linhas do OUTPUT que a escrita deve fazer recalcular: as dos lançamentos cujo I:P novo
+        # difere do que já estava no INPUT (regravar os mesmos valores não muda o OUTPUT)
+        alteradas = set()
+        for t in lote:
+            novos = {item["range"]: item["values"][0] for nome, data, _ in t.escritas if nome == "input" for item in data}
+            for l in t.lancamentos:
+                valores = novos.get(f"I{l['linha_in']}:P{l['linha_in']}")
+                if l["linha_out"] and valores is not None and not mesmos_valores(lidas["input"][l["linha_in"]][7:15], valores):
+                    alteradas.add(l["linha_out"])
+        return alteradas
+
+    def _gravar_gatilhos(self, trabalhos, antes, alteradas):
+        """Grava em Z/AL o A Emitir recalculado pela planilha; retorna {id do trabalho: erro}."""
+        pendentes = [(t, l) for t in trabalhos for l in t.lancamentos if l["linha_out"] and l["key"] not in t.gatilhos]
+        if not pendentes:
+            return {}
+        ids = {t.id for t, _ in pendentes}
+        linhas = sorted({l["linha_out"] for _, l in pendentes})
+        saida = self._abas["output"]
+        # Sem linha alterada (mesmos valores, ou reenvio só dos gatilhos) a leitura é imediata
+        espera = lambda: aguardar_recalculo(saida, linhas, [antes[l] for l in linhas], self.prazo_recalculo,
+                                            esperadas=alteradas)
+        inicio = time.monotonic()
+        lido, erro = self._com_repeticao(espera, trabalhos, ids)
+        if erro:
+            return dict.fromkeys(ids, erro)
+        (atuais, _), espera_s = lido, time.monotonic() - inicio
+        atuais = dict(zip(linhas, atuais))
+
+        coletor, gravados, checks, avisos, atrasadas = ColetorCelulas(), {}, {}, {}, {}
+        divergentes = checks_divergentes = 0
+        for t, l in pendentes:
+            linha = atuais[l["linha_out"]]
+            # Pronta: a escrita não mexeu nesta linha, ou ela já mudou desde antes da escrita
+            pronta = l["linha_out"] not in alteradas or linha != antes[l["linha_out"]]
+            brutos = [linha[c] if c < len(linha) else "" for c, _ in COLUNAS_GATILHO]
+            valores = tuple(limpar_valor_monetario(v) for v in brutos)
+            esperado = l.get("esperado")
+            diferencas = [] if esperado is None else [
+                f"{l['key']} {plataforma}: planilha R$ {formatar_moeda(v)}, cálculo local R$ {formatar_moeda(e)}"
+                for plataforma, v, e in zip(("Meta", "Google"), valores, esperado) if abs(v - e) >= 0.005]
+            lidos = {nome: str(linha[c]).strip() if c < len(linha) else "" for nome, c in COLUNAS_CHECK.items()}
+            checks_diferentes = [f"{l['key']} {nome}: planilha '{lidos[nome]}', cálculo local '{e}'"
+                                 for nome, e in (l.get("checks") or {}).items() if lidos[nome] != str(e).strip()]
+            if not pronta and (esperado is None or diferencas or checks_diferentes):
+                # A linha ainda pode estar com o valor de antes da escrita: não grava no escuro
+                atrasadas.setdefault(t.id, []).append(l["key"])
+                continue
+            for (_, coluna), valor in zip(COLUNAS_GATILHO, brutos):
+                coletor.adicionar(l["linha_out"], coluna, valor)
+            gravados.setdefault(t.id, {})[l["key"]] = valores
+            checks.setdefault(t.id, {})[l["key"]] = lidos
+            avisos.setdefault(t.id, []).extend(diferencas + checks_diferentes)
+            divergentes += bool(diferencas)
+            checks_divergentes += bool(checks_diferentes)
+        if coletor.celulas:
+            _, erro = self._com_repeticao(
+                lambda: saida.batch_update(coletor.lote(), value_input_option='USER_ENTERED'), trabalhos, ids)
+            if erro:
+                return dict.fromkeys(ids, erro)
+        with self._cond:
+            for t in trabalhos:
+                if t.id in ids:
+                    t.gatilhos.update(gravados.get(t.id, {}))
+                    t.checks.update(checks.get(t.id, {}))
+                    t.avisos += avisos.get(t.id, [])
+                    t.espera_recalculo = espera_s
+            self._paridade["comparados"] += sum(1 for t, l in pendentes
+                                                if l.get("esperado") is not None and l["key"] in gravados.get(t.id, {}))
+            self._paridade["divergentes"] += divergentes
+            self._paridade["checks_divergentes"] += checks_divergentes
+        return {id: f"A planilha não recalculou em {espera_s:.0f}s; gatilhos não gravados para "
+                    f"{', '.join(chaves[:5])}{', ...' if len(chaves) > 5 else ''}. Reenvie em instantes."
+                for id, chaves in atrasadas.items()}
+
+    def _com_repeticao(self, chamada, lote, ids):
+        """Executa `chamada` repetindo em erros transitórios; retorna (resultado, erro)."""
+        espera = self.espera_inicial
+        for tentativa in range(1, self.max_tentativas + 1):
+            try:
+                return chamada(), None
+            except Exception as e:
+                if not erro_repetivel(e) or tentativa == self.max_tentativas:
+                    return None, f"{type(e).__name__}: {e}"
+            with self._cond:
+                for t in lote:
+                    if t.id in ids:
+                        t.tentativas += 1
+            if self._monitor:
+                self._monitor.contar_tentativa()
+            time.sleep(espera * random.uniform(0.5, 1.0))
+            espera = min(espera * 2, self.espera_max)
+
+    def _finalizar(self, trabalhos, erro):
+        with self._cond:
+            for t in trabalhos:
+                t.estado, t.erro, t.concluido_em = (ERRO if erro else CONCLUIDO), erro, time.time()
+            concluidos = [(t, t.resumo()) for t in trabalhos if not erro and t.ao_concluir]
+        for t, resumo in concluidos:
+            try:
+                t.ao_concluir(resumo)
+            except Exception as e:
+                with self._cond:
+                    t.avisos.append(f"Após gravar: {type(e).__name__}: {e}")
+
+
+def aguardar_filas(timeout=None):
+    """Espera todas as filas do processo esvaziarem (benchmark e scripts)."""
+    return all(f.aguardar(timeout) for f in list(_filas))
@@ -0,0 +1,150 @@
+"""Histórico local dos diagnósticos (SQLite), para consultas de tendência.
+
+A planilha só guarda o resultado mais recente de cada cliente. Cada envio
+das páginas de lançamento (e do lote_massa) grava aqui, depois que a fila
+conclui a gravação, uma linha por cliente com a key, o squad, o mês de
+referência, os checks e os valores a emitir lidos do OUTPUT.
+Vale o último registro de cada (key, mês); os índices (key, referencia) e
+(squad, referencia) deixam as consultas em milissegundos.
+"""
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+
+from conversao import normalizar_id, normalizar_ids
+
+ARQUIVO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "historico.sqlite3")
+
+# Coluna do diagnóstico -> coluna da tabela
+CHECKS = {"Check 1 FB": "check1_fb", "Check 1 GL": "check1_gl", "Check 2": "check2", "Check 3": "check3",
+          "Check 4 Meta": "check4_meta", "Check 4 Google": "check4_google"}
+CHECKS_VAZIO_OK = ("check1_fb", "check1_gl")  # check 1 vazio é plataforma não contratada
+
+ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS resultados (
+    id INTEGER PRIMARY KEY,
+    registrado_em TEXT NOT NULL,
+    referencia TEXT NOT NULL,
+    key TEXT NOT NULL,
+    cliente TEXT,
+    squad TEXT,
+    origem TEXT,
+    {", ".join(f"{c} TEXT" for c in CHECKS.values())},
+    a_emitir_meta REAL,
+    a_emitir_google REAL
+);
+CREATE INDEX IF NOT EXISTS idx_resultados_key_ref ON resultados (key, referencia);
+CREATE INDEX IF NOT EXISTS idx_resultados_squad_ref ON resultados (squad, referencia);
+"""
+
+
+def arquivo_historico():
+    """Arquivo em BOLETOS_HISTORICO; com a planilha local, em memória (salvo se a variável for informada)."""
+    arquivo = os.environ.get("BOLETOS_HISTORICO")
+    if arquivo is None:
+        arquivo = ":memory:" if os.environ.get("BOLETOS_BACKEND") == "local" else ARQUIVO_PADRAO
+    return arquivo
+
+
+def referencia_do_mes(dia=None):
+    """'AAAA-MM' do mês de `dia` (hoje por padrão)."""
+    return (dia or date.today()).strftime("%Y-%m")
+
+
+def meses_ate(referencia, n):
+    """Os `n` meses terminando em `referencia`, do mais antigo ao mais recente."""
+    ano, mes = map(int, referencia.split("-"))
+    meses = []
+    for _ in range(n):
+        meses.append(f"{ano:04d}-{mes:02d}")
+        ano, mes = (ano - 1, 12) if mes == 1 else (ano, mes - 1)
+    return meses[::-1]
+
+
+def _ultimos(filtro):
+    # Último registro de cada (key, mês) entre os que passam no `filtro` (usa os índices)
+    return f"SELECT * FROM resultados WHERE id IN (SELECT MAX(id) FROM resultados WHERE {filtro} GROUP BY key, referencia)"
+
+
+def _filtro_periodo(periodo, squad):
+    filtro = f"referencia IN ({', '.join('?' * len(periodo))})" + (" AND squad = ?" if squad else "")
+    return filtro, (*periodo, *([squad] if squad else []))
+
+
+def _nok(coluna):
+    # Expressão SQL: check fora de OK (check 1 vazio conta como OK)
+    vazio_ok = f" AND {coluna} <> ''" if coluna in CHECKS_VAZIO_OK else ""
+    return f"(COALESCE({coluna}, '') <> 'OK'{vazio_ok})"
+
+
+class Historico:
+    """Conexão única por processo (compartilhada via st.cache_resource), protegida por lock."""
+
+    def __init__(self, arquivo=ARQUIVO_PADRAO):
+        self.arquivo = arquivo
+        self._conn = sqlite3.connect(arquivo, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(ESQUEMA)
+
+    def registrar(self, diag, origem, dia=None, a_emitir=None, checks=None):
+        """Grava uma linha por cliente de `diag` (resultado de `diagnosticar`); retorna quantas.
+
+        Com `a_emitir` ({key: (meta, google)}, como os `gatilhos` de um trabalho
+        da fila), só as keys presentes são gravadas, com esses valores; com
+        `checks` ({key: {check: valor}}, os `checks` do mesmo trabalho), os
+        checks também vêm da planilha em vez de `diag`.
+        """
+        chaves = normalizar_ids(diag["Key"])
+        meta, google = diag["A Emitir Meta"], diag["A Emitir Google"]
+        if a_emitir is not None:
+            manter = chaves.isin(list(a_emitir)).values
+            diag, chaves = diag[manter], chaves[manter]
+            meta, google = [a_emitir[c][0] for c in chaves], [a_emitir[c][1] for c in chaves]
+        if diag.empty:
+            return 0
+        valores_checks = [diag[c].astype(str) for c in CHECKS]
+        if checks is not None:
+            valores_checks = [[checks[k][c] if k in checks else v for k, v in zip(chaves, diag[c].astype(str))]
+                              for c in CHECKS]
+        agora = datetime.now().isoformat(timespec="seconds")
+        referencia = referencia_do_mes(dia)
+        linhas = [(agora, referencia, chave, cliente, squad, origem, *valores, float(m), float(g))
+                  for chave, cliente, squad, m, g, *valores in zip(
+                      chaves, diag["Clientes"], diag["SQUAD"], meta, google, *valores_checks)]
+        colunas = ["registrado_em", "referencia", "key", "cliente", "squad", "origem", *CHECKS.values(),
+                   "a_emitir_meta", "a_emitir_google"]
+        with self._lock, self._conn:
+            self._conn.executemany(f"INSERT INTO resultados ({', '.join(colunas)}) "
+                                   f"VALUES ({', '.join('?' * len(colunas))})", linhas)
+        return len(linhas)
+
+    def _consultar(self, sql, parametros=()):
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, parametros)]
+
+    def falhas_consecutivas(self, check, meses, referencia=None, squad=None):
+        """Clientes com `check` fora de OK em cada um dos `meses` meses até `referencia`."""
+        coluna = CHECKS[check]
+        periodo = meses_ate(referencia or referencia_do_mes(), meses)
+        filtro, parametros = _filtro_periodo(periodo, squad)
+        sql = (f"SELECT key AS \"Key\", MAX(cliente) AS \"Cliente\", MAX(squad) AS \"SQUAD\", "
+               f"SUM(a_emitir_meta + a_emitir_google) AS \"A Emitir no período\" "
+               f"FROM ({_ultimos(filtro)}) WHERE {_nok(coluna)} GROUP BY key HAVING COUNT(*) = ? ORDER BY 2")
+        return self._consultar(sql, (*parametros, len(periodo)))
+
+    def tendencia(self, squad=None, meses=12, referencia=None):
+        """Por mês: clientes registrados, quantos com cada check fora de OK e o total a emitir."""
+        periodo = meses_ate(referencia or referencia_do_mes(), meses)
+        filtro, parametros = _filtro_periodo(periodo, squad)
+        nok = ", ".join(f"SUM({_nok(c)}) AS \"{nome}\"" for nome, c in CHECKS.items())
+        sql = (f"SELECT referencia AS \"Mês\", COUNT(*) AS \"Clientes\", {nok}, "
+               f"SUM(a_emitir_meta + a_emitir_google) AS \"A Emitir\" "
+               f"FROM ({_ultimos(filtro)}) GROUP BY referencia ORDER BY referencia")
+        return self._consultar(sql, parametros)
+
+    def do_cliente(self, key):
+        """Último resultado de cada mês de um cliente, do mais recente ao mais antigo."""
+        return self._consultar(f"{_ultimos('key = ?')} ORDER BY referencia DESC", (normalizar_id(key),))
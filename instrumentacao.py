@@ -0,0 +1,181 @@
+"""Registro das chamadas à API do Sheets por sessão e por execução do Streamlit.
+
+`AbaInstrumentada` envolve a worksheet crua (abaixo do cache, então só conta
+requisições reais) e entrega cada chamada ao `Monitor`, que:
+- guarda as chamadas da execução atual e os totais de cada sessão;
+- mantém contadores móveis de leituras/escritas no último minuto, para
+  comparar com a quota do Google;
+- separa o tempo de uma execução em rede e o resto (Python/renderização);
+- emite um log estruturado (JSON) por chamada no logger "boletos.api".
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from planilha import coluna_letra
+
+# Quota padrão do Sheets por usuário (a service account conta como um usuário)
+QUOTA_LEITURAS_MIN = 60
+QUOTA_ESCRITAS_MIN = 60
+
+METODOS_LEITURA = {"get_all_values", "row_values", "col_values", "batch_get", "get", "find"}
+METODOS_ESCRITA = {"update", "batch_update", "update_cell"}
+MAX_SESSOES = 200
+
+logger = logging.getLogger("boletos.api")
+logger.addHandler(logging.NullHandler())  # handler e nível ficam com quem roda o app
+
+
+def _intervalo(metodo, args, kwargs):
+    # Range legível da chamada, para o log e o painel
+    if metodo == "get_all_values":
+        return "(aba inteira)"
+    if metodo == "row_values":
+        return f"{args[0]}:{args[0]}" if args else ""
+    if metodo == "update_cell":
+        return f"{coluna_letra(args[1])}{args[0]}" if len(args) > 1 else ""
+    if metodo == "batch_update":
+        dados = args[0] if args else kwargs.get("data", [])
+        return ",".join(d["range"] for d in dados)
+    if metodo == "batch_get":
+        return ",".join(args[0] if args else kwargs.get("ranges", []))
+    if metodo == "update":
+        return next((a for a in args if isinstance(a, str)), kwargs.get("range_name", ""))
+    return str(args[0]) if args else ""
+
+
+def _linhas(metodo, args, kwargs, resultado):
+    if metodo in METODOS_ESCRITA:
+        if metodo == "update_cell":
+            return 1
+        if metodo == "batch_update":
+            return sum(len(d["values"]) for d in (args[0] if args else kwargs.get("data", [])))
+        valores = next((a for a in args if isinstance(a, list)), kwargs.get("values", []))
+        return len(valores or [])
+    if metodo == "batch_get":
+        return sum(len(b) for b in resultado or [])
+    if metodo in ("row_values", "col_values"):
+        return 1
+    if metodo == "find":
+        return 1 if resultado else 0
+    return len(resultado or [])
+
+
+class Monitor:
+    """Coleta as chamadas de todas as sessões; compartilhado via st.cache_resource."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._minuto = deque()  # (instante, "leitura"|"escrita") do último minuto
+        self._sessoes = OrderedDict()
+
+    # --- contexto da execução (um thread por execução do script) ---
+    def iniciar_execucao(self, sessao, execucao, pagina):
+        self._local.sessao = sessao
+        self._local.execucao = execucao
+        self._local.pagina = pagina
+        self._local.inicio = time.perf_counter()
+        self._local.chamadas = []
+        self._local.tentativas = 0
+
+    def contar_tentativa(self):
+        """Chamado por camadas de retry para que a próxima chamada registre a repetição."""
+        self._local.tentativas = getattr(self._local, "tentativas", 0) + 1
+
+    # --- registro ---
+    def registrar(self, metodo, aba, intervalo, linhas, latencia, erro=None):
+        tipo = "escrita" if metodo in METODOS_ESCRITA else "leitura"
+        evento = {
+            "sessao": getattr(self._local, "sessao", None),
+            "execucao": getattr(self._local, "execucao", None),
+            "pagina": getattr(self._local, "pagina", None),
+            "metodo": metodo,
+            "tipo": tipo,
+            "aba": aba,
+            "range": intervalo,
+            "linhas": linhas,
+            "latencia_ms": round(latencia * 1000, 1),
+            "tentativas": getattr(self._local, "tentativas", 0) + 1,
+            "erro": erro,
+        }
+        self._local.tentativas = 0
+        agora = time.monotonic()
+        with self._lock:
+            self._minuto.append((agora, tipo))
+            self._descartar_antigos(agora)
+            evento["leituras_min"], evento["escritas_min"] = self._contagem_minuto()
+            sessao = self._sessoes.setdefault(evento["sessao"], {"chamadas": 0, "leituras": 0, "escritas": 0,
+                                                                  "linhas": 0, "latencia_s": 0.0, "erros": 0})
+            self._sessoes.move_to_end(evento["sessao"])
+            while len(self._sessoes) > MAX_SESSOES:
+                self._sessoes.popitem(last=False)
+            sessao["chamadas"] += 1
+            sessao[tipo + "s"] += 1
+            sessao["linhas"] += linhas
+            sessao["latencia_s"] += latencia
+            sessao["erros"] += bool(erro)
+        if hasattr(self._local, "chamadas"):
+            self._local.chamadas.append(evento)
+        logger.info(json.dumps(evento, ensure_ascii=False))
+
+    def _descartar_antigos(self, agora):
+        while self._minuto and agora - self._minuto[0][0] > 60:
+            self._minuto.popleft()
+
+    def _contagem_minuto(self):
+        leituras = sum(1 for _, t in self._minuto if t == "leitura")
+        return leituras, len(self._minuto) - leituras
+
+    # --- consulta ---
+    def por_minuto(self):
+        """(leituras, escritas) de todas as sessões nos últimos 60s."""
+        with self._lock:
+            self._descartar_antigos(time.monotonic())
+            return self._contagem_minuto()
+
+    def chamadas_execucao(self):
+        return list(getattr(self._local, "chamadas", []))
+
+    def totais_sessao(self, sessao):
+        with self._lock:
+            return dict(self._sessoes.get(sessao, {}))
+
+    def tempos_execucao(self):
+        """Detalha o tempo da execução atual em rede e resto."""
+        total = time.perf_counter() - getattr(self._local, "inicio", time.perf_counter())
+        rede = sum(c["latencia_ms"] for c in self.chamadas_execucao()) / 1000
+        return {"total": total, "rede": rede, "resto": max(total - rede, 0.0)}
+
+
+class AbaInstrumentada:
+    """Envolve uma worksheet e registra cada chamada de API no `Monitor`."""
+
+    def __init__(self, nome, aba, monitor):
+        self.nome = nome
+        self._aba = aba
+        self._monitor = monitor
+
+    def __getattr__(self, attr):
+        valor = getattr(self._aba, attr)
+        if attr not in METODOS_LEITURA | METODOS_ESCRITA:
+            return valor
+
+        @functools.wraps(valor)
+        def chamada(*args, **kwargs):
+            inicio = time.perf_counter()
+            resultado, erro = None, None
+            try:
+                resultado = valor(*args, **kwargs)
+                return resultado
+            except Exception as e:
+                erro = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                self._monitor.registrar(attr, self.nome, _intervalo(attr, args, kwargs),
+                                        _linhas(attr, args, kwargs, resultado),
+                                        time.perf_counter() - inicio, erro)
+        return chamada
@@ -0,0 +1,145 @@
+"""Limite de requisições ao Sheets compartilhado por todas as sessões.
+
+Todas as sessões usam a mesma service account, então a quota por minuto é
+uma só. O `Limitador` mantém um balde de tokens para leituras e outro para
+escritas; cada requisição do cliente gspread (ver `http_client_limitado`)
+pega um token antes de sair e, sem token, espera na fila em vez de falhar.
+
+- A capacidade do balde é a rajada permitida; a reposição é calculada para
+  que rajada + reposição em 60s não passe da quota.
+- Quem está em segundo plano (a fila de escritas, ver `segundo_plano`) só
+  passa depois das requisições da interface e deixa uma reserva no balde.
+- Um 429 que escape (outro processo na mesma conta) esvazia o balde e a
+  requisição é repetida depois da espera, sem chegar ao operador.
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+PRIORIDADE_INTERFACE, PRIORIDADE_SEGUNDO_PLANO = 0, 1
+RAJADA_PADRAO = 10
+RESERVA_INTERFACE = 0.2  # fração do balde que o segundo plano não consome
+MAX_REPETICOES_429 = 5
+
+_local = threading.local()
+
+
+@contextmanager
+def segundo_plano():
+    """Marca as requisições feitas neste thread como de baixa prioridade."""
+    anterior, _local.prioridade = getattr(_local, "prioridade", PRIORIDADE_INTERFACE), PRIORIDADE_SEGUNDO_PLANO
+    try:
+        yield
+    finally:
+        _local.prioridade = anterior
+
+
+def prioridade_atual():
+    return getattr(_local, "prioridade", PRIORIDADE_INTERFACE)
+
+
+class BaldeTokens:
+    """Token bucket com fila de espera por prioridade (FIFO dentro da mesma prioridade)."""
+
+    def __init__(self, por_minuto, rajada=RAJADA_PADRAO, reserva=RESERVA_INTERFACE):
+        self.capacidade = min(rajada, por_minuto)
+        self.taxa = max(por_minuto - self.capacidade, 1) / 60  # tokens por segundo
+        self.reserva = reserva * self.capacidade
+        self._tokens = float(self.capacidade)
+        self._atualizado = time.monotonic()
+        self._cond = threading.Condition()
+        self._fila = []
+        self._ordem = itertools.count()
+        self.espera_total = 0.0
+
+    def _repor(self):
+        agora = time.monotonic()
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado) * self.taxa)
+        self._atualizado = agora
+
+    def adquirir(self, prioridade=PRIORIDADE_INTERFACE):
+        """Bloqueia até haver token para esta requisição; retorna quanto esperou."""
+        inicio = time.monotonic()
+        minimo = 1 + (self.reserva if prioridade == PRIORIDADE_SEGUNDO_PLANO else 0)
+        with self._cond:
+            senha = (prioridade, next(self._ordem))
+            heapq.heappush(self._fila, senha)
+            self._cond.notify_all()  # quem estava na frente reavalia a prioridade
+            try:
+                while True:
+                    self._repor()
+                    if self._fila[0] == senha and self._tokens >= minimo:
+                        self._tokens -= 1
+                        break
+                    # Só o primeiro da fila espera com prazo; os outros aguardam a vez
+                    self._cond.wait((minimo - self._tokens) / self.taxa if self._fila[0] == senha else None)
+            finally:
+                self._fila.remove(senha)
+                heapq.heapify(self._fila)
+                self._cond.notify_all()
+        espera = time.monotonic() - inicio
+        self.espera_total += espera
+        return espera
+
+    def esvaziar(self):
+        """Zera os tokens (a API devolveu 429 mesmo dentro do limite)."""
+        with self._cond:
+            self._repor()
+            self._tokens = 0.0
+
+    def estado(self):
+        with self._cond:
+            self._repor()
+            return {"tokens": self._tokens, "capacidade": self.capacidade, "em_espera": len(self._fila),
+                    "espera_total_s": self.espera_total}
+
+
+class Limitador:
+    """Baldes de leitura e escrita; compartilhado via st.cache_resource."""
+
+    def __init__(self, leituras_min, escritas_min, rajada=RAJADA_PADRAO):
+        self.baldes = {"leitura": BaldeTokens(leituras_min, rajada), "escrita": BaldeTokens(escritas_min, rajada)}
+
+    def adquirir(self, tipo):
+        return self.baldes[tipo].adquirir(prioridade_atual())
+
+    def esvaziar(self, tipo):
+        self.baldes[tipo].esvaziar()
+
+    def estado(self):
+        return {tipo: balde.estado() for tipo, balde in self.baldes.items()}
+
+
+def tipo_requisicao(metodo, endpoint):
+    # GETs leem; dos POSTs, só as consultas por filtro não contam como escrita
+    if metodo.upper() == "GET" or endpoint.endswith(("getByDataFilter", "batchGetByDataFilter")):
+        return "leitura"
+    return "escrita"
+
+
+def http_client_limitado(limitador, monitor=None):
+    """Classe de HTTPClient do gspread que passa cada requisição pelo `limitador`.
+
+    Uso: gspread.authorize(creds, http_client=http_client_limitado(limitador)).
+    """
+    from gspread.exceptions import APIError
+    from gspread.http_client import HTTPClient
+
+    class HTTPClientLimitado(HTTPClient):
+        def request(self, method, endpoint, *args, **kwargs):
+            tipo = tipo_requisicao(method, endpoint)
+            for tentativa in range(MAX_REPETICOES_429 + 1):
+                limitador.adquirir(tipo)
+                try:
+                    return super().request(method, endpoint, *args, **kwargs)
+                except APIError as e:
+                    if e.code != 429 or tentativa == MAX_REPETICOES_429:
+                        raise
+                    limitador.esvaziar(tipo)
+                    if monitor:
+                        monitor.contar_tentativa()
+                    time.sleep(min(2 ** tentativa, 30))
+
+    return HTTPClientLimitado
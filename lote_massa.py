@@ -0,0 +1,208 @@
+"""Atualização em massa sem interface, a partir de um CSV ou Parquet exportado.
+
+Faz o mesmo que a página de atualização em massa: grava I:P no INPUT, calcula
+os checks localmente e, depois do recálculo, grava nos gatilhos Z/AL do
+OUTPUT o A Emitir da planilha. O arquivo é lido em blocos; cada bloco vira um batch_update por aba
+(pela fila de escritas, com repetição em 429/5xx) e as linhas do bloco vão
+para o arquivo de resultados com checks, valores e links de comunicação.
+
+Colunas esperadas no arquivo: Key e os campos de I:P com os nomes do INPUT
+(Método Meta, Crédito Meta, Data Saldo Meta, Gasto Diário Meta e os mesmos de
+Google). Campos ausentes ficam vazios.
+
+Depois de cada bloco gravado, um checkpoint (<resultados>.checkpoint.json)
+guarda quantas linhas já foram processadas; com --retomar o processamento
+continua dali.
+
+    python lote_massa.py fechamento.csv --credenciais conta.json
+    python lote_massa.py fechamento.parquet --credenciais conta.json --bloco 1000 --retomar
+    BOLETOS_BACKEND=local python lote_massa.py fechamento.csv   # planilha local
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from backend import BackendGspread, backend_local_padrao, ABAS
+from cards import links_do_registro
+from conversao import formatar_moeda, normalizar_ids
+from diagnostico import (CAMPOS_LANCAMENTO, checks_esperados, converter_lancamentos, diagnosticar_entradas,
+                         linhas_resultado, texto_boleto, valores_a_emitir)
+from fila_escritas import FilaEscritas, ERRO
+from historico import Historico, arquivo_historico
+from instrumentacao import QUOTA_LEITURAS_MIN, QUOTA_ESCRITAS_MIN
+from limitador import Limitador, http_client_limitado
+from planilha import AbaCacheada, CacheSnapshots
+
+BLOCO_PADRAO = 500
+ESCOPOS = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+COLUNAS_RESULTADO = ["Key", "Clientes", "Resultado", "Erros", "Check 1 FB", "Check 1 GL", "Check 2", "Check 3",
+                     "Check 4 Meta", "Check 4 Google", "A Emitir Meta", "A Emitir Google",
+                     "Boleto Meta", "Boleto Google", "WhatsApp", "Gmail"]
+# Colunas (0-based) das linhas de `linhas_resultado` levadas para o arquivo
+CAMPOS_SAIDA = {"Check 1 FB": 8, "Check 1 GL": 9, "Check 2": 12, "Check 3": 15, "Check 4 Meta": 17,
+                "Check 4 Google": 19, "A Emitir Meta": 24, "A Emitir Google": 36, "Boleto Meta": 27, "Boleto Google": 39}
+
+
+def abrir_planilha(credenciais=None):
+    """Abas cacheadas do backend: local (BOLETOS_BACKEND=local) ou Google Sheets com o limitador."""
+    if os.environ.get("BOLETOS_BACKEND") == "local":
+        backend = backend_local_padrao()
+    else:
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        if not credenciais:
+            raise SystemExit("Informe --credenciais com o JSON da service account (ou use BOLETOS_BACKEND=local).")
+        creds = ServiceAccountCredentials.from_json_keyfile_name(credenciais, ESCOPOS)
+        limitador = Limitador(QUOTA_LEITURAS_MIN, QUOTA_ESCRITAS_MIN)
+        backend = BackendGspread(gspread.authorize(creds, http_client=http_client_limitado(limitador)))
+    cache = CacheSnapshots(ttl=float("inf"))  # execução única: ninguém mais escreve pelo nosso cache
+    return {nome: AbaCacheada(nome, backend.abrir(nome), cache) for nome in ABAS}
+
+
+def ler_blocos(caminho, tamanho):
+    """Itera o arquivo em DataFrames de até `tamanho` linhas (texto, salvo números do Parquet)."""
+    if caminho.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq  # dependência opcional, só para Parquet
+        for lote in pq.ParquetFile(caminho).iter_batches(batch_size=tamanho):
+            # Colunas numéricas seguem como número (não passam pelo parser de texto pt-BR)
+            df = lote.to_pandas()
+            texto = df.select_dtypes(exclude="number").columns
+            df[texto] = df[texto].astype(object).fillna("").astype(str)
+            yield df
+    else:
+        yield from pd.read_csv(caminho, dtype=str, keep_default_na=False, chunksize=tamanho)
+
+
+class Checkpoint:
+    def __init__(self, caminho, arquivo):
+        self.caminho = caminho
+        self.arquivo = os.path.abspath(arquivo)
+        self.linhas = 0
+
+    def carregar(self):
+        with open(self.caminho, encoding="utf-8") as f:
+            dados = json.load(f)
+        if dados["arquivo"] != self.arquivo:
+            raise SystemExit(f"O checkpoint {self.caminho} é de outro arquivo ({dados['arquivo']}).")
+        self.linhas = dados["linhas"]
+
+    def salvar(self, linhas):
+        self.linhas = linhas
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({"arquivo": self.arquivo, "linhas": linhas, "atualizado_em": time.time()}, f)
+        os.replace(temporario, self.caminho)
+
+
+def processar_bloco(bloco, fila, clientes, chaves_in, chaves_out, contatos, historico=None):
+    """Valida, grava e diagnostica um bloco; retorna o DataFrame de resultados do bloco."""
+    bloco = bloco.reindex(columns=["Key"] + CAMPOS_LANCAMENTO, fill_value="")
+    chaves = normalizar_ids(bloco["Key"])
+    valores, validas, erros = converter_lancamentos(bloco)
+    erros_por_linha = {}
+    for linha, coluna, valor in erros.itertuples(index=False):
+        erros_por_linha.setdefault(linha, []).append(f"{coluna} '{valor}'")
+
+    resultados, entradas = {}, []
+    for i, chave, vals, ok in zip(bloco.index, chaves, valores, validas):
+        registro = chaves_in.get(chave)
+        if registro is None:
+            resultados[i] = {"Key": chave, "Resultado": "key não encontrada no INPUT"}
+        elif not ok:
+            resultados[i] = {"Key": chave, "Clientes": registro["Clientes"], "Resultado": "rejeitado",
+                             "Erros": "; ".join(erros_por_linha.get(i, []))}
+        else:
+            entradas.append({'i': i, 'linha': registro["_linha"], 'key': chave, 'name': registro["Clientes"], 'valores': vals})
+
+    if entradas:
+        diag = diagnosticar_entradas(clientes, entradas)
+        saidas = linhas_resultado(diag)
+        lancamentos = []
+        for e, linha, esperado, checks in zip(entradas, saidas, valores_a_emitir(diag), checks_esperados(diag)):
+            linha_out = chaves_out.get(e['key'], {}).get("_linha")
+            lancamentos.append({'key': e['key'], 'linha_in': int(e['linha']),
+                                'linha_out': int(linha_out) if linha_out else None, 'esperado': esperado,
+                                'checks': checks})
+            wpp, gmail = links_do_registro(contatos.get(e['key']))
+            resultados[e['i']] = {"Key": e['key'], "Clientes": e['name'],
+                                  "Resultado": "gravado" if linha_out else "gravado (key não encontrada no OUTPUT)",
+                                  **{nome: linha[c] for nome, c in CAMPOS_SAIDA.items()}, "WhatsApp": wpp, "Gmail": gmail}
+
+        updates = [{'range': f"I{e['linha']}:P{e['linha']}", 'values': [e['valores']]} for e in entradas]
+        id_trabalho = fila.enfileirar([("input", updates)], descricao="lote_massa", lancamentos=lancamentos)
+        fila.aguardar()
+        trabalho = fila.trabalho(id_trabalho)
+        if trabalho["estado"] == ERRO:
+            raise RuntimeError(f"Falha ao gravar o bloco: {trabalho['erro']}")
+        # Valem o A Emitir (que foi para os gatilhos) e os checks da planilha; a divergência fica registrada
+        for e, linha, esperado, checks in zip(entradas, saidas, valores_a_emitir(diag), checks_esperados(diag)):
+            if e['key'] in trabalho["gatilhos"]:
+                meta, google = trabalho["gatilhos"][e['key']]
+                lidos = trabalho["checks"][e['key']]
+                resultados[e['i']].update({**lidos, "A Emitir Meta": formatar_moeda(meta),
+                                           "A Emitir Google": formatar_moeda(google),
+                                           "Boleto Meta": texto_boleto(linha[5], meta),
+                                           "Boleto Google": texto_boleto(linha[6], google)})
+                if (any(abs(v - x) >= 0.005 for v, x in zip((meta, google), esperado))
+                        or any(lidos[n] != str(v).strip() for n, v in checks.items())):
+                    resultados[e['i']]["Resultado"] = "gravado (planilha difere do cálculo local)"
+        if historico:
+            # Só keys achadas no OUTPUT, com o A Emitir e os checks lidos da planilha
+            historico.registrar(diag, "lote_massa", a_emitir=trabalho["gatilhos"], checks=trabalho["checks"])
+
+    # Mesma ordem do arquivo de entrada
+    return pd.DataFrame([resultados[i] for i in bloco.index], columns=COLUNAS_RESULTADO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("arquivo", help="CSV ou Parquet com Key e os campos de I:P")
+    parser.add_argument("--saida", help="CSV de resultados (padrão: <arquivo>.resultados.csv)")
+    parser.add_argument("--bloco", type=int, default=BLOCO_PADRAO, help=f"linhas por bloco (padrão {BLOCO_PADRAO})")
+    parser.add_argument("--credenciais", help="JSON da service account do Google")
+    parser.add_argument("--retomar", action="store_true", help="continua do último checkpoint")
+    args = parser.parse_args()
+
+    saida = args.saida or os.path.splitext(args.arquivo)[0] + ".resultados.csv"
+    checkpoint = Checkpoint(saida + ".checkpoint.json", args.arquivo)
+    if args.retomar and os.path.exists(checkpoint.caminho):
+        checkpoint.carregar()
+        print(f"Retomando após {checkpoint.linhas} linhas já processadas.")
+    elif os.path.exists(saida):
+        os.remove(saida)
+
+    sheets = abrir_planilha(args.credenciais)
+    clientes, chaves_in = sheets["input"].por_chave("input_clientes")
+    _, chaves_out = sheets["output"].por_chave("output_chaves")
+    _, contatos = sheets["comm"].por_chave("comm_contatos")
+    fila = FilaEscritas(sheets)
+    historico = Historico(arquivo_historico())
+
+    inicio, processadas, contagem = time.monotonic(), 0, {}
+    for n, bloco in enumerate(ler_blocos(args.arquivo, args.bloco), start=1):
+        fim_bloco = (n - 1) * args.bloco + len(bloco)
+        if fim_bloco <= checkpoint.linhas:
+            continue
+        bloco = bloco.iloc[max(checkpoint.linhas - (n - 1) * args.bloco, 0):]
+        resultados = processar_bloco(bloco, fila, clientes, chaves_in, chaves_out, contatos, historico)
+        resultados.to_csv(saida, mode="a", header=not os.path.exists(saida), index=False)
+        checkpoint.salvar(fim_bloco)
+
+        processadas += len(bloco)
+        for resultado, qtd in resultados["Resultado"].value_counts().items():
+            contagem[resultado] = contagem.get(resultado, 0) + qtd
+        ritmo = processadas / max(time.monotonic() - inicio, 1e-9)
+        print(f"[bloco {n}] {fim_bloco} linhas · " + " · ".join(f"{qtd} {r}" for r, qtd in sorted(contagem.items())) +
+              f" · {ritmo:.0f} linhas/s", flush=True)
+
+    if os.path.exists(checkpoint.caminho):
+        os.remove(checkpoint.caminho)  # arquivo inteiro processado
+    print(f"Resultados em {saida}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
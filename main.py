@@ -1,10 +1,22 @@
 import streamlit as st
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
+import os
 import time
-import urllib.parse
 from datetime import datetime
+from barramento import Barramento, chaves_alteradas, publicando_por
+from backend import ABAS, BackendGspread, BackendPreguicoso, ErroConexao, backend_local_padrao
+from cards import links_do_registro, montar_cards
+from conversao import formatar_moeda, normalizar_id, normalizar_ids
+from diagnostico import (CAMPOS_DATA, CAMPOS_LANCAMENTO, CAMPOS_MOEDA, checks_esperados, converter_lancamentos,
+                         diagnosticar_entradas, linhas_resultado, valores_a_emitir)
+from historico import CHECKS, Historico, arquivo_historico, referencia_do_mes
+from fila_escritas import FilaEscritas, CONCLUIDO, ERRO
+from instrumentacao import Monitor, AbaInstrumentada, QUOTA_LEITURAS_MIN, QUOTA_ESCRITAS_MIN
+from limitador import Limitador, http_client_limitado
+from persistencia import SnapshotsEmDisco, pasta_snapshots
+from resumo import resumo_por_squad
+from planilha import CacheSnapshots, AbaCacheada, agrupar_intervalos, celulas_alteradas, conflitos_com_base
 
 # --- CONFIGURAÇÃO GLOBAL ---
 st.set_page_config(page_title="Sistema de Boletos v3.5", layout="wide")
@@ -75,42 +87,129 @@ st.markdown("""
     """, unsafe_allow_html=True)
 
 ALLOWED_STATUS = ["OK", "DUPLICADO", "ENCERRAR"]
+TODOS_SQUADS = "🌐 Todos os squads"
+COLUNAS_STATUS = {"Status Meta": 29, "Status Google": 41}  # AC e AO do OUTPUT (1-based)
+CACHE_TTL_SEGUNDOS = 60
+PREVIA_LOCAL = "Prévia do cálculo local (checks e A Emitir); ao gravar vale o que a planilha recalcular."
 
 # --- FUNÇÕES ---
 def init_connection():
+    # gspread e oauth2client só são importados quando a primeira aba é aberta
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
     creds_dict = st.secrets["gcp_service_account"]
     creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    return gspread.authorize(creds)
-
-def normalizar_id(valor):
-    return str(valor).replace(',', '.').strip()
-
-def limpar_valor_monetario(texto):
-    if not texto: return 0
-    limpo = str(texto).replace('R$', '').replace('.', '').replace(',', '.').strip()
-    try: return float(limpo)
-    except: return 0
+    # Toda requisição passa pelo limitador comum às sessões: rajadas esperam em vez de levar 429
+    return gspread.authorize(creds, http_client=http_client_limitado(get_limitador(), get_monitor()))
 
 def safe_get(lst, idx, default=""): return lst[idx] if idx < len(lst) else default
 def is_ok(val): return str(val).strip().upper() == "OK"
 
+def mostrar_checks(final_row):
+    cols = st.columns(6)
+    checks = [
+        ("Check 1: FB", safe_get(final_row, 8), ""), 
+        ("Check 1: GL", safe_get(final_row, 9), ""), 
+        ("Check 2 (Mídia)", safe_get(final_row, 12), f"Acordado: {safe_get(final_row, 10)} | Lançado: {safe_get(final_row, 11)}" if not is_ok(safe_get(final_row, 12)) else ""), 
+        ("Check 3 (Emissão)", safe_get(final_row, 15), f"Acordado: {safe_get(final_row, 13)} | Soma: {safe_get(final_row, 14)}" if not is_ok(safe_get(final_row, 15)) else ""), 
+        ("Check 4 (Meta)", safe_get(final_row, 17), "Saldo não durará até dia 10" if not is_ok(safe_get(final_row, 17)) else ""), 
+        ("Check 4 (Google)", safe_get(final_row, 19), "Saldo não durará até dia 10" if not is_ok(safe_get(final_row, 19)) else "")
+    ]
+    for i, (name, val, diff) in enumerate(checks):
+        if "Check 1" in name:
+            # Se for check 1, aceita Vazio como OK
+            ok_status = (not val or str(val).strip() == "" or is_ok(val))
+        else:
+            ok_status = is_ok(val)
+        cl = "ok-card" if ok_status else "nok-card"
+        with cols[i]:
+            st.markdown(f"""<div class='check-card {cl}'>{name}<br>{val}<div class='val-diff'>{diff}</div></div>""", unsafe_allow_html=True)
+
+@st.cache_resource
+def get_cache():
+    # Cache único por processo: todas as sessões compartilham os snapshots.
+    # A última carga de cada projeção fica em disco para a primeira tela após reiniciar
+    pasta = pasta_snapshots()
+    return CacheSnapshots(ttl=CACHE_TTL_SEGUNDOS, disco=SnapshotsEmDisco(pasta) if pasta else None)
+
+@st.cache_resource
+def get_monitor():
+    # Registro das chamadas à API de todas as sessões (painel de diagnóstico)
+    return Monitor()
+
+@st.cache_resource
+def get_barramento():
+    # Avisos de escrita entre as sessões do processo
+    return Barramento()
+
+@st.cache_resource
+def get_limitador():
+    # Baldes de leitura/escrita da quota da service account, um por processo
+    return Limitador(QUOTA_LEITURAS_MIN, QUOTA_ESCRITAS_MIN)
+
+def init_backend():
+    # BOLETOS_BACKEND=local usa a planilha em memória (dados opcionais em BOLETOS_DADOS_LOCAIS)
+    if os.environ.get("BOLETOS_BACKEND") == "local":
+        return backend_local_padrao()
+    return BackendGspread(init_connection())
+
 @st.cache_resource
 def get_sheets():
-    gc = init_connection()
-    SPREADSHEET_ID = "1zOof6YDL4U8hYMiFi5zt4V_alYK6EcRvV3QKERvNlhA"
-    ss = gc.open_by_key(SPREADSHEET_ID)
-    return {
-        "input": ss.worksheet("INPUT - BOLETOS"),
-        "output": ss.worksheet("OUTPUT - BOLETOS"),
-        "comm": ss.worksheet("COMUNICACAO - CLIENTE")
-    }
+    # Nada é aberto aqui: a conexão começa em segundo plano e as abas só a esperam no primeiro uso
+    backend = BackendPreguicoso(init_backend)
+    backend.aquecer()
+    cache, monitor = get_cache(), get_monitor()
+    # Instrumentação abaixo do cache: só conta requisições que saem para a API
+    return {nome: AbaCacheada(nome, AbaInstrumentada(nome, backend.abrir(nome), monitor), cache, get_barramento())
+            for nome in ABAS}
 
-try:
-    sheets = get_sheets()
-except Exception as e:
-    st.error(f"Erro ao conectar com a planilha: {e}")
-    st.stop()
+@st.cache_resource
+def get_fila():
+    # Um único thread de escrita por processo; grava pelas abas cacheadas (invalida o que escreve)
+    return FilaEscritas(get_sheets(), get_monitor())
+
+@st.cache_resource
+def get_historico():
+    # Histórico dos diagnósticos enviados (SQLite local), para as consultas de tendência
+    return Historico(arquivo_historico())
+
+sheets = get_sheets()
+
+def aviso_dados_antigos():
+    """Avisa quando a tela usa a cópia em disco; retorna True (somente leitura) até a planilha carregar."""
+    antigos = get_cache().antigos()
+    if not antigos: return False
+    salvo_em = datetime.fromtimestamp(min(antigos.values())).strftime("%d/%m %H:%M")
+    st.info(f"⏳ Mostrando os dados salvos em {salvo_em} enquanto a planilha carrega. Gravação liberada em instantes.")
+
+    # Quando a carga em segundo plano terminar, a página roda de novo com os dados atuais
+    @st.fragment(run_every=1)
+    def _aguardar_carga():
+        if not get_cache().antigos(): st.rerun()
+        for erro in get_cache().falhas().values():
+            st.warning(f"Não foi possível ler a planilha ({erro}); tentando de novo.")
+    _aguardar_carga()
+    return True
+
+def acompanhar_alteracoes(chaves=None):
+    """Avisa quando outra sessão grava clientes desta tela (`chaves`; None: qualquer um).
+
+    O cache compartilhado já marcou as linhas gravadas, então "Atualizar" roda
+    a página de novo relendo só elas.
+    """
+    seq, chaves = st.session_state.get("_seq_barramento", 0), None if chaves is None else set(chaves)
+
+    @st.fragment(run_every=5)
+    def _verificar():
+        eventos = get_barramento().desde(seq, sessao_atual())
+        if not eventos and eventos is not None: return
+        n = chaves_alteradas(eventos, chaves)
+        if n == 0: return
+        c1, c2 = st.columns([4, 1])
+        c1.info(f"🔄 {n} cliente(s) desta tela atualizados por outra sessão." if n else "🔄 A planilha foi atualizada por outra sessão.")
+        if c2.button("Atualizar", key="atualizar_alteracoes"): st.rerun()
+    _verificar()
 
 
 # ==============================================================================
@@ -119,21 +218,22 @@ except Exception as e:
 def pagina_lancamento():
     st.title("🏦 Gestor de Boletos - Lançamento Individual")
 
-    vals_in = sheets["input"].get_all_values()
-    df_input = pd.DataFrame(vals_in[4:], columns=vals_in[3])
-    df_input = df_input[df_input.iloc[:, 2] != ""].copy()
+    df_input = sheets["input"].projecao("input_clientes")
+    df_input = df_input[df_input["Clientes"] != ""]
+    somente_leitura = aviso_dados_antigos()
 
-    squad_list = sorted([s for s in df_input.iloc[:, 5].unique() if s and s != "-"] )
+    squad_list = sorted([s for s in df_input["SQUAD"].unique() if s and s != "-"] )
     selected_squad = st.sidebar.selectbox("Filtro SQUAD (Lançamento)", squad_list)
 
-    df_filtered = df_input[(df_input.iloc[:, 5] == selected_squad) & (df_input.iloc[:, 3].isin(ALLOWED_STATUS))]
+    df_filtered = df_input[(df_input["SQUAD"] == selected_squad) & (df_input["Status"].isin(ALLOWED_STATUS))]
+    acompanhar_alteracoes(normalizar_ids(df_filtered["Key"]))
 
     if df_filtered.empty:
         st.warning(f"Sem clientes disponíveis para {selected_squad}.")
     else:
-        cliente_sel = st.selectbox("Selecione o Cliente:", df_filtered.iloc[:, 2].tolist())
-        row_sel = df_filtered[df_filtered.iloc[:, 2] == cliente_sel].iloc[0]
-        key_orig = str(row_sel.iloc[1]).strip()
+        cliente_sel = st.selectbox("Selecione o Cliente:", df_filtered["Clientes"].tolist())
+        row_sel = df_filtered[df_filtered["Clientes"] == cliente_sel].iloc[0]
+        key_orig = str(row_sel["Key"]).strip()
         key_norm = normalizar_id(key_orig)
 
         st.divider()
@@ -153,67 +253,50 @@ def pagina_lancamento():
             g_dat = st.text_input("Data do Saldo Google", placeholder="DD/MM", key="v7")
             g_val = st.text_input("Gasto Diário Google", placeholder="Ex: 50,00", key="v8")
 
-        if st.button("💾 SALVAR E GERAR DIAGNÓSTICO"):
+        brutos = pd.DataFrame([[m_met, m_cre, m_dat, m_val, g_met, g_cre, g_dat, g_val]],
+                              columns=CAMPOS_LANCAMENTO, index=[row_sel["_linha"]])
+        (valores,), (valido,), erros = converter_lancamentos(brutos)
+        if not valido:
+            st.error("❌ Valores inválidos (use 1.500,00, sem sinal, e DD/MM do ano corrente): " +
+                     ", ".join(f"{c} '{v}'" for c, v in zip(erros["coluna"], erros["valor"])))
+        # Diagnóstico calculado localmente: a prévia acompanha o preenchimento, sem gravar nada
+        diag = diagnosticar_entradas(df_filtered, [{'linha': row_sel["_linha"], 'valores': valores}])
+        final_row = linhas_resultado(diag)[0]
+        st.markdown("### 📊 Auditoria de Cheques")
+        st.caption(PREVIA_LOCAL)
+        mostrar_checks(final_row)
+
+        if st.button("💾 SALVAR E GERAR DIAGNÓSTICO", disabled=not valido or somente_leitura):
             with st.spinner("Sincronizando..."):
                 try:
-                    # 1. Update Input
-                    cell_in = sheets["input"].find(key_orig, in_column=2)
-                    r_in = cell_in.row
-                    sheets["input"].update(f"I{r_in}:P{r_in}", [[m_met, limpar_valor_monetario(m_cre), m_dat, limpar_valor_monetario(m_val),
-                                                          g_met, limpar_valor_monetario(g_cre), g_dat, limpar_valor_monetario(g_val)]], value_input_option='USER_ENTERED')
-                    
-                    time.sleep(4) 
-
-                    # 2. Get Output
-                    data_out = sheets["output"].get_all_values()
-                    match_idx = -1
-                    for i, r in enumerate(data_out[7:]):
-                        if len(r) > 1 and normalizar_id(r[1]) == key_norm:
-                            match_idx = i + 8
-                            out_row_data = r
-                            break
+                    # 1. Linha do cliente no OUTPUT (o índice só é relido se a key não estiver nele)
+                    _, chaves_out = sheets["output"].por_chave("output_chaves")
+                    if key_norm not in chaves_out:
+                        _, chaves_out = sheets["output"].por_chave("output_chaves", atualizar=True)
+                    match_idx = chaves_out.get(key_norm, {}).get("_linha", -1)
+
+                    # 2. INPUT vai para a fila de escritas; a fila confere a key nas duas linhas e,
+                    # depois do recálculo, grava os gatilhos Z/AL com o A Emitir da planilha
+                    r_in = int(row_sel["_linha"])
+                    lancamento = {'key': key_norm, 'linha_in': r_in, 'linha_out': int(match_idx) if match_idx != -1 else None,
+                                  'esperado': valores_a_emitir(diag)[0], 'checks': checks_esperados(diag)[0]}
+                    # O histórico só recebe o que a fila gravou, com o A Emitir e os checks lidos da planilha
+                    historico = get_historico()
+                    id_trabalho = get_fila().enfileirar([("input", [{'range': f"I{r_in}:P{r_in}", 'values': [valores]}])],
+                                                        descricao=cliente_sel, sessao=sessao_atual(), lancamentos=[lancamento],
+                                                        ao_concluir=lambda t: historico.registrar(
+                                                            diag, "individual", a_emitir=t["gatilhos"], checks=t["checks"]))
 
                     if match_idx == -1:
                         st.error("❌ Key não encontrada na aba OUTPUT.")
                     else:
-                        # 3. Update Output Triggers
-                        sheets["output"].update_cell(match_idx, 26, out_row_data[24]) 
-                        sheets["output"].update_cell(match_idx, 38, out_row_data[36]) 
-                        
-                        time.sleep(2)
-                        final_row = sheets["output"].row_values(match_idx)
-
-                        st.success(f"✅ Dados de {cliente_sel} atualizados!")
-                        
-                        st.markdown("### 📊 Auditoria de Cheques")
-                        cols = st.columns(6)
-                        
-                        checks = [
-                            ("Check 1: FB", safe_get(final_row, 8), ""), 
-                            ("Check 1: GL", safe_get(final_row, 9), ""), 
-                            ("Check 2 (Mídia)", safe_get(final_row, 12), f"Acordado: {safe_get(final_row, 10)} | Lançado: {safe_get(final_row, 11)}" if not is_ok(safe_get(final_row, 12)) else ""), 
-                            ("Check 3 (Emissão)", safe_get(final_row, 15), f"Acordado: {safe_get(final_row, 13)} | Soma: {safe_get(final_row, 14)}" if not is_ok(safe_get(final_row, 15)) else ""), 
-                            ("Check 4 (Meta)", safe_get(final_row, 17), "Saldo não durará até dia 10" if not is_ok(safe_get(final_row, 17)) else ""), 
-                            ("Check 4 (Google)", safe_get(final_row, 19), "Saldo não durará até dia 10" if not is_ok(safe_get(final_row, 19)) else "")
-                        ]
-                        
-                        # --- AQUI ESTÁ A CORREÇÃO QUE VOCÊ PEDIU ---
-                        for i, (name, val, diff) in enumerate(checks):
-                            if "Check 1" in name:
-                                # Se for check 1, aceita Vazio como OK
-                                ok_status = (not val or str(val).strip() == "" or is_ok(val))
-                            else:
-                                ok_status = is_ok(val)
-                                
-                            cl = "ok-card" if ok_status else "nok-card"
-                            with cols[i]:
-                                st.markdown(f"""<div class='check-card {cl}'>{name}<br>{val}<div class='val-diff'>{diff}</div></div>""", unsafe_allow_html=True)
-                        # ---------------------------------------------
+                        st.success(f"✅ Dados de {cliente_sel} enviados para gravação (#{id_trabalho}).")
 
                         st.divider()
                         l_c, r_c = st.columns(2)
                         
                         with l_c:
+                            st.caption(PREVIA_LOCAL)
                             st.metric("A Emitir (Meta Ads)", f"R$ {safe_get(final_row, 24)}") 
                             st.metric("A Emitir (Google Ads)", f"R$ {safe_get(final_row, 36)}") 
                             if len(final_row) > 27 and final_row[27]: st.info(f"**Boleto Meta:** {final_row[27]}") 
@@ -222,51 +305,19 @@ def pagina_lancamento():
                         with r_c:
                             st.markdown("**Ações de Envio:**")
                             try:
-                                cell_comm = sheets["comm"].find(key_orig, in_column=2)
-                                row_comm_idx = cell_comm.row
+                                _, contatos = sheets["comm"].por_chave("comm_contatos")
+                                if key_norm not in contatos: raise ValueError("Key não encontrada na aba COMUNICACAO")
+                                row_comm_idx = contatos[key_norm]["_linha"]
                                 comm_vals = sheets["comm"].row_values(row_comm_idx, value_render_option='UNFORMATTED_VALUE')
                                 while len(comm_vals) < 15: comm_vals.append("")
 
-                                val_col_c = str(comm_vals[2]).strip()
-                                val_col_g = str(comm_vals[6]).strip()
-                                val_col_i = str(comm_vals[8]).strip()
-                                val_col_j = str(comm_vals[9]).strip()
-
-                                if val_col_j and val_col_j != "-" and val_col_j != "0":
-                                    texto_wpp = (
-                                        f"Olá, {val_col_g}!\n\n"
-                                        f"Foram enviados no e-mail {val_col_i}, os boletos das plataformas de anúncios.\n\n"
-                                        f"*Observações importantes:*\n"
-                                        f"1. Não conseguimos alterar a data de vencimento dos boletos.\n"
-                                        f"2. *De maneira alguma, realize o pagamento de boletos vencidos.*\n\n"
-                                        f"Qualquer dúvida, estou à disposição!"
-                                    )
-                                    msg_encoded = urllib.parse.quote(texto_wpp)
-                                    link_wpp = f"https://wa.me/{val_col_j}?text={msg_encoded}"
-                                    st.link_button(f"📲 Enviar WhatsApp ({val_col_g})", link_wpp)
-                                else:
-                                    st.warning("⚠️ Telefone não cadastrado.")
-
-                                if val_col_i and "@" in val_col_i:
-                                    agora = datetime.now()
-                                    data_ref = agora.strftime("%m - %Y")
-                                    assunto = f"Boleto Anúncios - {val_col_c} | Ref. {data_ref}"
-                                    corpo_email = (
-                                        f"Olá,\n\n"
-                                        f"Envio anexos os boletos referentes às plataformas de mídia paga.\n\n"
-                                        f"Observações importantes:\n"
-                                        f"1. Não é possível editar a data de vencimento do boleto gerado na plataforma e, por isto, pedimos para que o pagamento seja feito o mais rápido possível.\n"
-                                        f"2. De maneira alguma, realize o pagamento de boletos vencidos, sob pena de perder o valor adicionado indefinidamente.\n\n"
-                                        f"Ficamos à disposição para quaisquer esclarecimentos.\n\n"
-                                        f"Obrigada!\n\n"
-                                        f"Atenciosamente,"
-                                    )
-                                    params = {"view": "cm", "fs": "1", "to": val_col_i, "cc": "financeiro@comodoplanejados.com.br", "su": assunto, "body": corpo_email}
-                                    query_string = urllib.parse.urlencode(params, quote_via=urllib.parse.quote) 
-                                    link_gmail = f"https://mail.google.com/mail/?{query_string}"
-                                    st.link_button(f"📧 Abrir no Gmail ({val_col_i})", link_gmail)
-                                else:
-                                    st.warning("⚠️ E-mail não cadastrado.")
+                                registro = {"Cliente": comm_vals[2], "Contato": comm_vals[6], "E-mail": comm_vals[8], "Telefone": comm_vals[9]}
+                                link_wpp, link_gmail = links_do_registro(registro)
+
+                                if link_wpp: st.link_button(f"📲 Enviar WhatsApp ({str(comm_vals[6]).strip()})", link_wpp)
+                                else: st.warning("⚠️ Telefone não cadastrado.")
+                                if link_gmail: st.link_button(f"📧 Abrir no Gmail ({str(comm_vals[8]).strip()})", link_gmail)
+                                else: st.warning("⚠️ E-mail não cadastrado.")
 
                             except Exception as e:
                                 st.error(f"Erro na geração dos links: {e}")
@@ -281,21 +332,125 @@ def pagina_lancamento():
 def pagina_atualizacao_massa():
     st.title("🚀 Atualização em Massa - Boletos")
 
-    vals_in = sheets["input"].get_all_values()
-    df_input = pd.DataFrame(vals_in[4:], columns=vals_in[3])
-    df_input = df_input[df_input.iloc[:, 2] != ""].copy()
-    
-    df_input["_row_idx"] = df_input.index + 5 
+    df_input = sheets["input"].projecao("input_clientes")
+    df_input = df_input[df_input["Clientes"] != ""]
 
-    squad_list = sorted([s for s in df_input.iloc[:, 5].unique() if s and s != "-"] )
-    selected_squad = st.sidebar.selectbox("Filtro SQUAD (Massa)", squad_list)
+    squad_list = sorted([s for s in df_input["SQUAD"].unique() if s and s != "-"] )
+    selected_squad = st.sidebar.selectbox("Filtro SQUAD (Massa)", [TODOS_SQUADS] + squad_list, index=1 if squad_list else 0)
+    if selected_squad == TODOS_SQUADS:
+        painel_todos_squads(); return
+    somente_leitura = aviso_dados_antigos()
 
-    df_filtered = df_input[(df_input.iloc[:, 5] == selected_squad) & (df_input.iloc[:, 3].isin(ALLOWED_STATUS))]
+    df_filtered = df_input[(df_input["SQUAD"] == selected_squad) & (df_input["Status"].isin(ALLOWED_STATUS))]
+    acompanhar_alteracoes(normalizar_ids(df_filtered["Key"]))
 
     if df_filtered.empty:
         st.warning("Nenhum cliente disponível.")
         return
 
+    modo = st.radio("Modo de preenchimento", ["📋 Grade", "🗂️ Formulário"], horizontal=True,
+                    help="Grade: uma tabela paginada, envia só as linhas editadas. Formulário: um bloco por cliente.")
+    if modo == "📋 Grade":
+        entradas = entrada_grade_massa(df_filtered, selected_squad, somente_leitura)
+    else:
+        entradas = entrada_formulario_massa(df_filtered, somente_leitura)
+
+    if entradas is not None:
+        processar_envio_massa(entradas, df_filtered)
+
+
+OPCOES_METODO = ["", "Boleto", "PIX", "Cartão Pós", "Cartão Pré", "Sem Campanha"]
+COLUNAS_GRADE = ["Método Meta", "Crédito Meta", "Data Meta", "Gasto Meta",
+                 "Método Google", "Crédito Google", "Data Google", "Gasto Google"]
+LINHAS_POR_PAGINA = 50
+COLUNAS_PREVIA = ["Clientes", "Check 1 FB", "Check 1 GL", "Check 2", "Check 3", "Check 4 Meta", "Check 4 Google",
+                  "A Emitir Meta", "A Emitir Google"]
+
+def entrada_grade_massa(df_filtered, squad, somente_leitura=False):
+    """Grade editável paginada; retorna as linhas preenchidas ao enviar (ou None)."""
+    st.info("📝 Edite as linhas dos clientes; só as linhas preenchidas serão enviadas.")
+    # Edições de todas as páginas, por linha do INPUT, sobrevivem à troca de página
+    editados = st.session_state.setdefault("massa_editados", {}).setdefault(squad, {})
+
+    n_paginas = max(1, -(-len(df_filtered) // LINHAS_POR_PAGINA))
+    c1, c2 = st.columns([1, 3])
+    pagina = c1.number_input("Página", min_value=1, max_value=n_paginas, value=1, step=1)
+    resumo = c2.empty()
+    df_pag = df_filtered.iloc[(pagina - 1) * LINHAS_POR_PAGINA:pagina * LINHAS_POR_PAGINA]
+
+    # A base só é remontada ao trocar de squad/página: mudar os dados do editor
+    # a cada edição recriaria o widget e perderia o foco
+    versao = st.session_state.setdefault("massa_versao", 0)
+    chave_base = (squad, pagina, versao, tuple(df_pag["_linha"]))
+    if st.session_state.get("massa_base", (None,))[0] != chave_base:
+        base = pd.DataFrame({
+            "Clientes": df_pag["Clientes"].values,
+            "Método Meta": "", "Crédito Meta": float("nan"), "Data Meta": pd.NaT, "Gasto Meta": float("nan"),
+            "Método Google": "", "Crédito Google": float("nan"), "Data Google": pd.NaT, "Gasto Google": float("nan"),
+        }, index=df_pag["_linha"].values)
+        for linha, vals in editados.items():
+            if linha in base.index:
+                base.loc[linha, COLUNAS_GRADE] = vals
+        st.session_state["massa_base"] = (chave_base, base)
+    base = st.session_state["massa_base"][1]
+
+    metodo = lambda nome: st.column_config.SelectboxColumn(nome, options=OPCOES_METODO)
+    moeda = lambda nome: st.column_config.NumberColumn(nome, min_value=0, format="R$ %.2f")
+    data = lambda nome: st.column_config.DateColumn(nome, format="DD/MM")
+    editado = st.data_editor(base, key=f"grade_massa_{squad}_{pagina}_{versao}", hide_index=True, use_container_width=True,
+                             disabled=["Clientes"], column_config={
+                                 "Método Meta": metodo("🟦 Método"), "Crédito Meta": moeda("🟦 Crédito"),
+                                 "Data Meta": data("🟦 Data"), "Gasto Meta": moeda("🟦 Gasto Diário"),
+                                 "Método Google": metodo("🟩 Método"), "Crédito Google": moeda("🟩 Crédito"),
+                                 "Data Google": data("🟩 Data"), "Gasto Google": moeda("🟩 Gasto Diário")})
+
+    for linha, row in editado[COLUNAS_GRADE].iterrows():
+        vals = row.tolist()
+        if any(v != "" and not pd.isna(v) for v in vals): editados[linha] = vals
+        else: editados.pop(linha, None)
+
+    resumo.caption(f"{len(df_filtered)} clientes · {n_paginas} páginas · {len(editados)} linhas preenchidas")
+    entradas = entradas_grade(editados, df_filtered)
+    if entradas:
+        # Prévia instantânea: mesmo cálculo dos cards, antes de gravar qualquer coisa
+        with st.expander(f"👁️ Prévia do diagnóstico ({len(entradas)} linhas)"):
+            diag = diagnosticar_entradas(df_filtered, entradas)
+            st.dataframe(diag[COLUNAS_PREVIA], hide_index=True, use_container_width=True,
+                         column_config={c: st.column_config.NumberColumn(format="R$ %.2f") for c in ("A Emitir Meta", "A Emitir Google")})
+    if not st.button(f"🚀 ENVIAR {len(editados)} LINHAS PREENCHIDAS", type="primary", disabled=somente_leitura):
+        return None
+
+    # Nova versão do editor: as edições enviadas não reaparecem na grade
+    editados.clear()
+    st.session_state["massa_versao"] = versao + 1
+    st.session_state.pop("massa_base", None)
+    return entradas
+
+def entradas_grade(editados, df_filtered):
+    """Converte as linhas editadas na grade em entradas de envio (valores de I:P), validadas como no formulário."""
+    dados = df_filtered.set_index("_linha")
+    linhas = [linha for linha in sorted(editados) if linha in dados.index]
+    if not linhas: return []
+    brutos = pd.DataFrame([editados[linha] for linha in linhas], columns=CAMPOS_LANCAMENTO, index=linhas)
+    # Datas vão com o ano para converter_lancamentos recusar outro ano; gravadas como DD/MM
+    for campo in CAMPOS_DATA:
+        brutos[campo] = pd.to_datetime(brutos[campo]).dt.strftime("%d/%m/%Y").fillna("")
+    for campo in CAMPOS_MOEDA:
+        brutos[campo] = pd.to_numeric(brutos[campo])
+    valores, validas, erros = converter_lancamentos(brutos)
+    if not erros.empty:
+        mostrar_erros_lancamento(erros, df_filtered)
+    posicoes_data = [CAMPOS_LANCAMENTO.index(campo) for campo in CAMPOS_DATA]
+    entradas = []
+    for linha, vals, ok in zip(linhas, valores, validas):
+        if not ok: continue
+        for i in posicoes_data: vals[i] = vals[i][:5]
+        entradas.append({'linha': linha, 'key': normalizar_id(dados.at[linha, 'Key']), 'name': dados.at[linha, 'Clientes'],
+                         'valores': vals})
+    return entradas
+
+def entrada_formulario_massa(df_filtered, somente_leitura=False):
+    """Formulário com um bloco por cliente; retorna as linhas preenchidas ao enviar (ou None)."""
     st.info("📝 Preencha os campos. Clientes em branco serão ignorados.")
 
     inputs = {}
@@ -306,184 +461,91 @@ def pagina_atualizacao_massa():
                 row_key = str(i)
                 with c1:
                     st.markdown("**🟦 Meta Ads**")
-                    inputs[f"m_met_{row_key}"] = st.selectbox("Método", ["", "Boleto", "PIX", "Cartão Pós", "Cartão Pré", "Sem Campanha"], key=f"m1_{row_key}")
+                    inputs[f"m_met_{row_key}"] = st.selectbox("Método", OPCOES_METODO, key=f"m1_{row_key}")
                     inputs[f"m_cre_{row_key}"] = st.text_input("Crédito", placeholder="R$ 0,00", key=f"m2_{row_key}")
                     inputs[f"m_dat_{row_key}"] = st.text_input("Data", placeholder="DD/MM", key=f"m3_{row_key}")
                     inputs[f"m_val_{row_key}"] = st.text_input("Gasto Diário", placeholder="R$ 0,00", key=f"m4_{row_key}")
                 with c2:
                     st.markdown("**🟩 Google Ads**")
-                    inputs[f"g_met_{row_key}"] = st.selectbox("Método", ["", "Boleto", "PIX", "Cartão Pós", "Cartão Pré", "Sem Campanha"], key=f"g1_{row_key}")
+                    inputs[f"g_met_{row_key}"] = st.selectbox("Método", OPCOES_METODO, key=f"g1_{row_key}")
                     inputs[f"g_cre_{row_key}"] = st.text_input("Crédito", placeholder="R$ 0,00", key=f"g2_{row_key}")
                     inputs[f"g_dat_{row_key}"] = st.text_input("Data", placeholder="DD/MM", key=f"g3_{row_key}")
                     inputs[f"g_val_{row_key}"] = st.text_input("Gasto Diário", placeholder="R$ 0,00", key=f"g4_{row_key}")
         
-        btn_enviar = st.form_submit_button("🚀 ENVIAR ATUALIZAÇÕES", type="primary")
-
-    if btn_enviar:
-        with st.status("Processando...", expanded=True) as status:
-            updates = []
-            clients_meta = [] 
-            
-            # 1. Coleta Inputs
-            for i, row in df_filtered.iterrows():
-                row_key = str(i)
-                has_data = (
-                    inputs[f"m_met_{row_key}"] != "" or inputs[f"m_cre_{row_key}"] != "" or
-                    inputs[f"g_met_{row_key}"] != "" or inputs[f"g_cre_{row_key}"] != ""
-                )
-                
-                if has_data:
-                    real_row = row["_row_idx"]
-                    data_row = [
-                        inputs[f"m_met_{row_key}"], limpar_valor_monetario(inputs[f"m_cre_{row_key}"]), inputs[f"m_dat_{row_key}"], limpar_valor_monetario(inputs[f"m_val_{row_key}"]),
-                        inputs[f"g_met_{row_key}"], limpar_valor_monetario(inputs[f"g_cre_{row_key}"]), inputs[f"g_dat_{row_key}"], limpar_valor_monetario(inputs[f"g_val_{row_key}"])
-                    ]
-                    updates.append({'range': f"I{real_row}:P{real_row}", 'values': [data_row]})
-                    clients_meta.append({'key': normalizar_id(row['Key']), 'name': row['Clientes']})
-
-            if not updates:
-                st.warning("Nada preenchido."); return
-
-            # 2. Envia
-            sheets["input"].batch_update(updates, value_input_option='USER_ENTERED')
-            
-            status.write("Enviado! Calculando (4s)...")
-            time.sleep(4)
-            
-            # 3. Baixa Output e Comm
-            status.write("Baixando resultados...")
-            all_out = sheets["output"].get_all_values()
-            all_comm = sheets["comm"].get_all_values()
-            
-            status.update(label="Concluído!", state="complete", expanded=True)
-
-            st.divider()
-            st.markdown("## 🎉 Resultados")
-            
-            # 4. Gera Cards HTML
-            for client in clients_meta:
-                c_key = client['key']
-                c_name = client['name']
-                
-                # Busca nas listas baixadas
-                out_row = next((r for r in all_out[7:] if len(r) > 1 and normalizar_id(r[1]) == c_key), None)
-                comm_row = next((r for r in all_comm if len(r) > 2 and normalizar_id(r[1]) == c_key), None)
-                
-                if out_row:
-                    # Preparação dos Checks
-                    val_c2 = safe_get(out_row, 12)
-                    diff_c2 = f"Acordado: {safe_get(out_row, 10)}<br>Lançado: {safe_get(out_row, 11)}" if not is_ok(val_c2) else ""
-
-                    val_c3 = safe_get(out_row, 15)
-                    diff_c3 = f"Acordado: {safe_get(out_row, 13)}<br>Soma: {safe_get(out_row, 14)}" if not is_ok(val_c3) else ""
-
-                    val_c4m = safe_get(out_row, 17)
-                    diff_c4m = "Saldo baixo" if not is_ok(val_c4m) else ""
-                    
-                    val_c4g = safe_get(out_row, 19)
-                    diff_c4g = "Saldo baixo" if not is_ok(val_c4g) else ""
-                    
-                    checks_data = [
-                        ("FB", safe_get(out_row, 8), ""), 
-                        ("GL", safe_get(out_row, 9), ""),
-                        ("Mídia", val_c2, diff_c2), 
-                        ("Emissão", val_c3, diff_c3),
-                        ("Meta", val_c4m, diff_c4m), 
-                        ("Google", val_c4g, diff_c4g)
-                    ]
-                    
-                    checks_html_str = ""
-                    for name, val, diff in checks_data:
-                        if name in ["FB", "GL"]:
-                            cls = "check-ok" if (not val or str(val).strip() == "" or is_ok(val)) else "check-nok"
-                        else:
-                            cls = "check-ok" if is_ok(val) else "check-nok"
-                        
-                        diff_html = f"<div style='font-size:0.65em; margin-top:3px; line-height:1.1; opacity:0.9;'>{diff}</div>" if diff else ""
-                        checks_html_str += f"<div class='mass-check-box {cls}'>{name}<br>{val}{diff_html}</div>"
-
-                    # Valores
-                    val_meta = str(safe_get(out_row, 24)).replace("R$", "").strip()
-                    val_google = str(safe_get(out_row, 36)).replace("R$", "").strip()
-                    txt_meta = safe_get(out_row, 27)
-                    txt_google = safe_get(out_row, 39)
-
-                    # Botões
-                    btns_html = ""
-                    if comm_row:
-                         val_col_c = str(comm_row[2]).strip()
-                         val_col_g = str(comm_row[6]).strip()
-                         val_col_i = str(comm_row[8]).strip()
-                         val_col_j = str(comm_row[9]).strip()
-                         
-                         if val_col_j and val_col_j not in ["-", "0", ""]:
-                             texto_wpp = (
-                                f"Olá, {val_col_g}!\n\n"
-                                f"Foram enviados no e-mail {val_col_i}, os boletos das plataformas de anúncios.\n\n"
-                                f"*Observações importantes:*\n"
-                                f"1. Não conseguimos alterar a data de vencimento dos boletos.\n"
-                                f"2. *De maneira alguma, realize o pagamento de boletos vencidos.*\n\n"
-                                f"Qualquer dúvida, estou à disposição!"
-                             )
-                             link = f"https://wa.me/{val_col_j}?text={urllib.parse.quote(texto_wpp)}"
-                             btns_html += f"<a href='{link}' target='_blank' style='text-decoration:none; flex:1;'><button style='background-color:#238636;color:white;border:none;padding:12px;border-radius:6px;width:100%;cursor:pointer;font-weight:bold;margin-right:5px;'>WhatsApp</button></a>"
-                         
-                         if val_col_i and "@" in val_col_i:
-                             agora = datetime.now()
-                             data_ref = agora.strftime("%m - %Y")
-                             assunto = f"Boleto Anúncios - {val_col_c} | Ref. {data_ref}"
-                             corpo_email = (
-                                f"Olá,\n\n"
-                                f"Envio anexos os boletos referentes às plataformas de mídia paga.\n\n"
-                                f"Observações importantes:\n"
-                                f"1. Não é possível editar a data de vencimento do boleto gerado na plataforma e, por isto, pedimos para que o pagamento seja feito o mais rápido possível.\n"
-                                f"2. De maneira alguma, realize o pagamento de boletos vencidos, sob pena de perder o valor adicionado indefinidamente.\n\n"
-                                f"Ficamos à disposição para quaisquer esclarecimentos.\n\n"
-                                f"Obrigada!\n\n"
-                                f"Atenciosamente,"
-                             )
-                             params = {"view": "cm", "fs": "1", "to": val_col_i, "cc": "financeiro@comodoplanejados.com.br", "su": assunto, "body": corpo_email}
-                             qs = urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
-                             link = f"https://mail.google.com/mail/?{qs}"
-                             btns_html += f"<a href='{link}' target='_blank' style='text-decoration:none; flex:1;'><button style='background-color:#cf222e;color:white;border:none;padding:12px;border-radius:6px;width:100%;cursor:pointer;font-weight:bold;margin-left:5px;'>Gmail</button></a>"
-
-                    # HTML Card
-                    html_card = f"""
-                    <div class="mass-card">
-                        <div class="mass-title">{c_name}</div>
-                        <div style="font-size:0.8em; margin-bottom:5px; color:#aaa;">📊 Auditoria de Cheques</div>
-                        <div class="mass-checks-grid">
-                            {checks_html_str}
-                        </div>
-                        <div class="mass-values">
-                            <div class="mass-val-col">
-                                <div class="mass-label">Meta Ads</div>
-                                <div class="mass-money">R$ {val_meta}</div>
-                                <div class="mass-boleto">{txt_meta if txt_meta else 'Sem Boleto'}</div>
-                            </div>
-                            <div style="border-left:1px solid #30363d;"></div>
-                            <div class="mass-val-col">
-                                <div class="mass-label">Google Ads</div>
-                                <div class="mass-money">R$ {val_google}</div>
-                                <div class="mass-boleto">{txt_google if txt_google else 'Sem Boleto'}</div>
-                            </div>
-                        </div>
-                        <div style="display:flex; justify-content:space-between;">
-                            {btns_html}
-                        </div>
-                    </div>
-                    """
-                    st.markdown(html_card, unsafe_allow_html=True)
-                    
-                    # Trigger Output
-                    match_idx_out = -1
-                    for idx, r in enumerate(all_out[7:]):
-                         if len(r) > 1 and normalizar_id(r[1]) == c_key:
-                             match_idx_out = idx + 8; break
-                    
-                    if match_idx_out != -1:
-                        sheets["output"].update_cell(match_idx_out, 26, safe_get(out_row, 24))
-                        sheets["output"].update_cell(match_idx_out, 38, safe_get(out_row, 36))
+        btn_enviar = st.form_submit_button("🚀 ENVIAR ATUALIZAÇÕES", type="primary", disabled=somente_leitura)
+
+    if not btn_enviar:
+        return None
+
+    prefixos = ["m_met", "m_cre", "m_dat", "m_val", "g_met", "g_cre", "g_dat", "g_val"]
+    brutos = pd.DataFrame({campo: [inputs[f"{p}_{i}"] for i in df_filtered.index] for campo, p in zip(CAMPOS_LANCAMENTO, prefixos)},
+                          index=df_filtered["_linha"].values)
+    brutos = brutos[(brutos[["Método Meta", "Crédito Meta", "Método Google", "Crédito Google"]] != "").any(axis=1)]
+    # Linhas com texto malformado são barradas aqui, antes de custar uma escrita
+    valores, validas, erros = converter_lancamentos(brutos)
+    if not erros.empty:
+        mostrar_erros_lancamento(erros, df_filtered)
+    dados = df_filtered.set_index("_linha")
+    return [{'linha': linha, 'key': normalizar_id(dados.at[linha, 'Key']), 'name': dados.at[linha, 'Clientes'], 'valores': vals}
+            for linha, vals, ok in zip(brutos.index, valores, validas) if ok]
+
+def mostrar_erros_lancamento(erros, df_clientes):
+    """Lista as células rejeitadas; os clientes com erro não são enviados."""
+    tabela = erros.assign(Cliente=erros["linha"].map(df_clientes.set_index("_linha")["Clientes"]))
+    st.error(f"❌ {tabela['Cliente'].nunique()} cliente(s) com valores inválidos não serão enviados (use 1.500,00, sem sinal, e DD/MM do ano corrente).")
+    st.dataframe(tabela[["Cliente", "coluna", "valor"]].rename(columns={"coluna": "Campo", "valor": "Valor digitado"}),
+                 hide_index=True, use_container_width=True)
+
+def processar_envio_massa(entradas, df_clientes):
+    """Enfileira a gravação das linhas e mostra os cards com o diagnóstico calculado localmente."""
+    with st.status("Processando...", expanded=True) as status:
+        # 1. Monta o lote
+        if not entradas:
+            st.warning("Nada preenchido."); return
+        updates = [{'range': f"I{e['linha']}:P{e['linha']}", 'values': [e['valores']]} for e in entradas]
+        clients_meta = [{'key': e['key'], 'name': e['name']} for e in entradas]
+
+        # 2. Prévia dos checks e valores, sem esperar o recálculo da planilha
+        status.write("Calculando diagnóstico...")
+        diag = diagnosticar_entradas(df_clientes, entradas)
+        saidas = linhas_resultado(diag)
+
+        # 3. Linhas do OUTPUT para os gatilhos (o índice só é relido se faltar alguma key)
+        _, chaves_out = sheets["output"].por_chave("output_chaves")
+        if any(c['key'] not in chaves_out for c in clients_meta):
+            _, chaves_out = sheets["output"].por_chave("output_chaves", atualizar=True)
+        linhas_out = {c['key']: chaves_out[c['key']]["_linha"] for c in clients_meta if c['key'] in chaves_out}
+        _, idx_comm = sheets["comm"].por_chave("comm_contatos", atualizar=True)
+
+        status.update(label="Concluído!", state="complete", expanded=True)
+
+        st.divider()
+        st.markdown("## 🎉 Resultados")
+
+        # 4. Cards de todos os clientes numa passada, em poucos blocos de HTML
+        st.caption(PREVIA_LOCAL)
+        # Sem linha no OUTPUT não há gatilho a gravar nem card a mostrar
+        itens = [(c['name'], r, idx_comm.get(c['key'])) for c, r in zip(clients_meta, saidas) if c['key'] in linhas_out]
+        fora = [c['name'] for c in clients_meta if c['key'] not in linhas_out]
+        if fora:
+            st.warning(f"⚠️ {len(fora)} cliente(s) sem key na aba OUTPUT; só o INPUT será gravado: "
+                       + ", ".join(fora[:10]) + (", ..." if len(fora) > 10 else ""))
+        for bloco in montar_cards(itens):
+            st.markdown(bloco, unsafe_allow_html=True)
+
+        # 5. INPUT num só trabalho da fila (a sessão segue livre enquanto grava); depois do
+        # recálculo a fila grava os gatilhos Z/AL com o A Emitir da planilha
+        lancamentos = [{'key': e['key'], 'linha_in': int(e['linha']),
+                        'linha_out': int(linhas_out[e['key']]) if e['key'] in linhas_out else None,
+                        'esperado': esperado, 'checks': checks}
+                       for e, esperado, checks in zip(entradas, valores_a_emitir(diag), checks_esperados(diag))]
+        historico = get_historico()
+        id_trabalho = get_fila().enfileirar([("input", updates)],
+                                            descricao=f"{len(entradas)} clientes (massa)", sessao=sessao_atual(),
+                                            lancamentos=lancamentos,
+                                            ao_concluir=lambda t: historico.registrar(
+                                                diag, "massa", a_emitir=t["gatilhos"], checks=t["checks"]))
+        st.success(f"📤 {len(entradas)} clientes enviados para gravação (#{id_trabalho}).")
 
 
 # ==============================================================================
@@ -493,43 +555,204 @@ def pagina_dashboard():
     st.title("📊 Dashboard de Status - Squads")
     with st.spinner("Carregando dados..."):
         try:
-            raw_out = sheets["output"].get_all_values()
-            header = raw_out[6] 
-            data_rows = raw_out[7:] 
-            df_out = pd.DataFrame(data_rows, columns=header)
-            df_final = df_out[(df_out.iloc[:, 1].str.strip() != "") & (df_out.iloc[:, 3].isin(ALLOWED_STATUS))].copy()
+            df_out = sheets["output"].projecao("output_dashboard")
+            df_final = df_out[(df_out["Key"].str.strip() != "") & (df_out["Status"].isin(ALLOWED_STATUS))]
         except Exception as e: st.error(str(e)); return
 
     squads = sorted([s for s in df_final["SQUAD"].unique() if s and s != "-"])
     if not squads: st.warning("Sem dados."); return
-    sel_squad = st.sidebar.selectbox("Filtro SQUAD (Dashboard)", squads)
-    df_squad = df_final[df_final["SQUAD"] == sel_squad].copy()
+    sel_squad = st.sidebar.selectbox("Filtro SQUAD (Dashboard)", [TODOS_SQUADS] + squads, index=1)
+    if sel_squad == TODOS_SQUADS:
+        painel_todos_squads(); return
+    somente_leitura = aviso_dados_antigos()
+    df_squad = df_final[df_final["SQUAD"] == sel_squad]
+    acompanhar_alteracoes(normalizar_ids(df_squad["Key"]))
     
-    st.divider()
-    df_editor = pd.DataFrame()
-    df_editor["Key"] = df_squad.iloc[:, 1]
-    df_editor["Clientes"] = df_squad.iloc[:, 2]
-    df_editor["Status Meta"] = df_squad.iloc[:, 28]
-    df_editor["Status Google"] = df_squad.iloc[:, 40]
-    df_editor["_original_index"] = df_squad.index
+    # Abas preguiçosas: só o conteúdo da aba aberta é executado
+    aba_status, aba_historico = st.tabs(["📋 Status", "📈 Histórico"], key="aba_dashboard", on_change="rerun")
+    if aba_historico.open:
+        with aba_historico: painel_historico(sel_squad, df_squad)
+    if aba_status.open:
+        with aba_status: editor_status(df_squad, sel_squad, somente_leitura)
+
+def editor_status(df_squad, sel_squad, somente_leitura):
+    """Editor dos status AC/AO do squad; salva só as células alteradas."""
+    df_editor = df_squad[["Key", "Clientes", "Status Meta", "Status Google", "_linha"]]
 
     opcoes = ["", "EMITIDO", "ENVIADO", "NOK", "FINALIZADO", "ISENTO"]
-    edited = st.data_editor(df_editor, column_config={"_original_index":None, "Status Meta":st.column_config.SelectboxColumn(options=opcoes), "Status Google":st.column_config.SelectboxColumn(options=opcoes)}, hide_index=True, use_container_width=True)
+    chave_editor = f"status_{sel_squad}"
+    edited = st.data_editor(df_editor, key=chave_editor, column_config={"_linha":None, "Status Meta":st.column_config.SelectboxColumn(options=opcoes), "Status Google":st.column_config.SelectboxColumn(options=opcoes)}, hide_index=True, use_container_width=True)
+    conferir = st.checkbox("Não sobrescrever status alterados por outra pessoa desde que a tela carregou", value=True)
+
+    if st.button("💾 SALVAR STATUS EM LOTE", type="primary", disabled=somente_leitura):
+        # Só as células editadas, com linhas vizinhas da mesma coluna num range só
+        celulas = celulas_alteradas(df_editor, edited, COLUNAS_STATUS)
+        if not celulas: st.info("Nenhum status alterado."); return
+        conflitos = conflitos_com_base(sheets["output"], celulas) if conferir else {}
+        if conflitos:
+            nomes = dict(zip(df_editor["_linha"], df_editor["Clientes"]))
+            rotulos = {c: n for n, c in COLUNAS_STATUS.items()}
+            st.warning("Alterados por outra pessoa e mantidos: " + "; ".join(
+                f"{nomes.get(l, l)} ({rotulos[c]}: '{atual}')" for (l, c), atual in conflitos.items()))
+            # O cache ainda tem o valor antigo dessas linhas
+            get_cache().invalidar_linhas("output", {l for l, _ in conflitos})
+            celulas = [c for c in celulas if (c[0], c[1]) not in conflitos]
+        if celulas:
+            with publicando_por({sessao_atual()}):
+                sheets["output"].batch_update(agrupar_intervalos([(l, c, v) for l, c, v, _ in celulas]))
+            st.success(f"{len(celulas)} status atualizados!")
+        if not conflitos:
+            st.session_state.pop(chave_editor, None); time.sleep(1); st.rerun()
+
+def painel_historico(squad, df_squad):
+    """Consultas de tendência no histórico local dos diagnósticos, sem ler a planilha."""
+    historico = get_historico()
+    escopo = None if st.checkbox("Todos os squads", key="historico_todos") else squad
+    c1, c2 = st.columns(2)
+    check = c1.selectbox("Check", list(CHECKS), index=4)
+    meses = c2.number_input("Meses seguidos", min_value=2, max_value=12, value=3)
+    moeda = st.column_config.NumberColumn(format="R$ %.2f")
+
+    inicio = time.perf_counter()
+    falhas = historico.falhas_consecutivas(check, meses, squad=escopo)
+    tendencia = historico.tendencia(escopo)
+    tempo_ms = (time.perf_counter() - inicio) * 1000
+
+    st.markdown(f"#### {check} fora de OK em cada um dos últimos {meses} meses (até {referencia_do_mes()})")
+    if falhas: st.dataframe(pd.DataFrame(falhas), hide_index=True, use_container_width=True, column_config={"A Emitir no período": moeda})
+    else: st.caption("Nenhum cliente.")
+
+    st.markdown("#### Tendência mensal")
+    if tendencia:
+        df_tend = pd.DataFrame(tendencia).set_index("Mês")
+        st.line_chart(df_tend[list(CHECKS)])
+        st.dataframe(df_tend, use_container_width=True, column_config={"A Emitir": moeda})
+    else: st.caption("Sem diagnósticos registrados no período.")
+
+    cliente = st.selectbox("Histórico de um cliente", [""] + df_squad["Clientes"].tolist())
+    if cliente:
+        key = df_squad.loc[df_squad["Clientes"] == cliente, "Key"].iloc[0]
+        st.dataframe(pd.DataFrame(historico.do_cliente(key)), hide_index=True, use_container_width=True)
+    st.caption(f"Consultas no histórico local: {tempo_ms:.1f} ms.")
+
+def painel_todos_squads():
+    """Resumo de todos os squads com uma leitura do OUTPUT, no lugar de abrir squad por squad."""
+    st.subheader(TODOS_SQUADS)
+    df_out = sheets["output"].projecao("output_resumo")
+    df_out = df_out[(df_out["Key"].str.strip() != "") & (df_out["Status"].isin(ALLOWED_STATUS))]
+    aviso_dados_antigos()
+    acompanhar_alteracoes()
+    tabela = resumo_por_squad(df_out)
+    if tabela.empty: st.warning("Sem dados."); return
+
+    total = tabela.iloc[-1]
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Clientes", int(total["Clientes"]))
+    c2.metric("Emissões pendentes", int(total["Emissões pendentes"]))
+    c3.metric("Pendente a emitir", f"R$ {formatar_moeda(total['Pendente total'])}")
+    c4.metric("Clientes c/ check NOK", int(total["Clientes c/ check NOK"]))
+
+    moeda = st.column_config.NumberColumn(format="R$ %.2f")
+    st.dataframe(tabela, hide_index=True, use_container_width=True,
+                 column_config={c: moeda for c in ("Pendente Meta", "Pendente Google", "Pendente total")})
+    st.caption("Pendente: valor a emitir sem status EMITIDO, ENVIADO, FINALIZADO ou ISENTO na plataforma.")
 
-    if st.button("💾 SALVAR STATUS EM LOTE", type="primary"):
-        updates = []
-        for i, row in edited.iterrows():
-            real_row = int(row["_original_index"]) + 8
-            updates.append({'range': f"AC{real_row}", 'values': [[row["Status Meta"]]]})
-            updates.append({'range': f"AO{real_row}", 'values': [[row["Status Google"]]]})
-        if updates: sheets["output"].batch_update(updates); st.success("Atualizado!"); time.sleep(1); st.rerun()
+# ==============================================================================
+# FILA DE GRAVAÇÃO (na sidebar, enquanto a sessão tiver trabalhos)
+# ==============================================================================
+ICONES_ESTADO = {CONCLUIDO: "✅", ERRO: "❌"}
+
+def painel_gravacoes():
+    trabalhos = get_fila().trabalhos(sessao_atual(), limite=10)
+    if not trabalhos: return
+    pendentes = any(t["estado"] not in ICONES_ESTADO for t in trabalhos)
+
+    # Enquanto houver gravação pendente o painel se atualiza sozinho, sem rerodar a página;
+    # quando a fila esvazia (ou um reenvio a enche de novo) a página roda uma vez para
+    # redefinir o fragmento com ou sem o intervalo
+    @st.fragment(run_every=2 if pendentes else None)
+    def _painel():
+        atuais = get_fila().trabalhos(sessao_atual(), limite=10)
+        if pendentes and all(t["estado"] in ICONES_ESTADO for t in atuais):
+            st.rerun()
+        with st.expander("📤 Gravações", expanded=True):
+            for t in atuais:
+                repeticoes = f" · {t['tentativas']} repetições" if t["tentativas"] else ""
+                recalculo = f" · recálculo {t['espera_recalculo']:.1f}s" if t["espera_recalculo"] is not None else ""
+                st.caption(f"{ICONES_ESTADO.get(t['estado'], '⏳')} #{t['id']} {t['descricao']} — {t['estado']}{repeticoes}{recalculo}")
+                if t["checks"]:
+                    # Checks lidos do OUTPUT recalculado (check 1 vazio é plataforma não contratada)
+                    nok = [k for k, checks in t["checks"].items()
+                           if not all(is_ok(v) or (n.startswith("Check 1") and not v) for n, v in checks.items())]
+                    st.caption(f"Checks na planilha: {len(t['checks']) - len(nok)} de {len(t['checks'])} clientes OK"
+                               + (f" (pendentes: {', '.join(nok[:5])}{', ...' if len(nok) > 5 else ''})" if nok else ""))
+                if t["avisos"]:
+                    st.warning("Planilha diferente do cálculo local (gravado o valor da planilha): " +
+                               "; ".join(t["avisos"][:3]) + (f" e mais {len(t['avisos']) - 3}" if len(t["avisos"]) > 3 else ""))
+                if t["estado"] == ERRO:
+                    st.error(t["erro"])
+                    if st.button("🔁 Reenviar", key=f"reenviar_{t['id']}"):
+                        get_fila().reenviar(t["id"])
+                        st.rerun()
+
+    with st.sidebar: _painel()
+
+# ==============================================================================
+# DIAGNÓSTICO DE API (opcional, na sidebar)
+# ==============================================================================
+def sessao_atual():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else "local"
+
+def painel_diagnostico():
+    monitor = get_monitor()
+    with st.sidebar.expander("🩺 Diagnóstico de API", expanded=True):
+        leituras, escritas = monitor.por_minuto()
+        st.progress(min(leituras / QUOTA_LEITURAS_MIN, 1.0), text=f"Leituras no último minuto: {leituras}/{QUOTA_LEITURAS_MIN}")
+        st.progress(min(escritas / QUOTA_ESCRITAS_MIN, 1.0), text=f"Escritas no último minuto: {escritas}/{QUOTA_ESCRITAS_MIN}")
+        if os.environ.get("BOLETOS_BACKEND") != "local":
+            st.caption("Limitador: " + " · ".join(
+                f"{tipo} {b['tokens']:.1f}/{b['capacidade']} tokens, {b['em_espera']} na fila, {b['espera_total_s']:.1f}s de espera"
+                for tipo, b in get_limitador().estado().items()))
+
+        t = monitor.tempos_execucao()
+        st.caption(f"Esta execução: {t['total']:.2f}s — rede {t['rede']:.2f}s · resto {t['resto']:.2f}s")
+        paridade = get_fila().paridade()
+        if paridade["comparados"]:
+            st.caption(f"Gatilhos conferidos: {paridade['comparados']}, com a planilha diferente do cálculo local em "
+                       f"{paridade['divergentes']} (A Emitir) e {paridade['checks_divergentes']} (checks)")
+        chamadas = monitor.chamadas_execucao()
+        if chamadas:
+            df_cham = pd.DataFrame(chamadas)[["metodo", "aba", "range", "linhas", "latencia_ms", "tentativas", "erro"]]
+            st.dataframe(df_cham, hide_index=True)
+        else:
+            st.caption("Nenhuma chamada à API nesta execução (dados do cache).")
+
+        tot = monitor.totais_sessao(sessao_atual())
+        if tot:
+            st.caption(f"Sessão: {tot['chamadas']} chamadas ({tot['leituras']} leituras, {tot['escritas']} escritas), "
+                       f"{tot['linhas']} linhas, {tot['latencia_s']:.1f}s de rede, {tot['erros']} erros")
 
 # ==============================================================================
 # NAVEGAÇÃO
 # ==============================================================================
 st.sidebar.title("Menu")
 pagina = st.sidebar.radio("Ir para:", ["📝 Lançamento Individual", "🚀 Atualização em Massa", "📊 Dashboard Status"])
+if st.sidebar.button("🔄 Recarregar planilha"): get_cache().invalidar()
+mostrar_diagnostico = st.sidebar.checkbox("🩺 Diagnóstico de API")
+
+st.session_state["_execucao"] = st.session_state.get("_execucao", 0) + 1
+# A página lida agora já inclui tudo o que foi publicado até aqui
+st.session_state["_seq_barramento"] = get_barramento().ultimo()
+get_monitor().iniciar_execucao(sessao_atual(), st.session_state["_execucao"], pagina)
+
+try:
+    if pagina == "📝 Lançamento Individual": pagina_lancamento()
+    elif pagina == "🚀 Atualização em Massa": pagina_atualizacao_massa()
+    else: pagina_dashboard()
+except ErroConexao as e:
+    # Sem cópia em disco e sem planilha: só esta página falha; a próxima execução tenta conectar de novo
+    st.error(f"Erro ao conectar com a planilha: {e}")
 
-if pagina == "📝 Lançamento Individual": pagina_lancamento()
-elif pagina == "🚀 Atualização em Massa": pagina_atualizacao_massa()
-else: pagina_dashboard()
+painel_gravacoes()
+if mostrar_diagnostico: painel_diagnostico()
@@ -0,0 +1,60 @@
+"""Última versão boa das projeções gravada em disco (Parquet).
+
+Depois de reiniciar o container o cache em memória está vazio; com estes
+arquivos a primeira tela aparece na hora, com os dados da última carga, em
+modo somente leitura, enquanto a planilha é lida em segundo plano (ver
+`CacheSnapshots`). Precisa de pyarrow, que já vem com o Streamlit; sem ele a
+persistência fica desligada.
+"""
+import os
+
+import pandas as pd
+
+PASTA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots")
+
+
+def pasta_snapshots():
+    """Pasta configurada em BOLETOS_SNAPSHOTS (vazia desliga).
+
+    Com a planilha local (BOLETOS_BACKEND=local) fica desligada, salvo se a
+    variável for informada: os dados locais são refeitos a cada execução.
+    """
+    pasta = os.environ.get("BOLETOS_SNAPSHOTS")
+    if pasta is None:
+        pasta = "" if os.environ.get("BOLETOS_BACKEND") == "local" else PASTA_PADRAO
+    return pasta or None
+
+
+class SnapshotsEmDisco:
+    """Um arquivo Parquet por entrada do cache ("input:input_clientes" etc.)."""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, chave.replace(":", "__") + ".parquet")
+
+    def ler(self, chave):
+        """(DataFrame, salvo em epoch) ou None se não houver arquivo legível."""
+        caminho = self._caminho(chave)
+        try:
+            return pd.read_parquet(caminho), os.path.getmtime(caminho)
+        except (OSError, ImportError, ValueError):
+            return None
+
+    def salvar(self, chave, df):
+        """Grava de forma atômica; falhas de disco não interrompem o app."""
+        if not isinstance(df, pd.DataFrame):
+            return False
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.pasta, exist_ok=True)
+            df.to_parquet(temporario, index=False)
+            os.replace(temporario, caminho)
+            return True
+        except (OSError, ImportError, ValueError):
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return False
+
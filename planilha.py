@@ -0,0 +1,620 @@
+import re
+import threading
+import time
+
+import pandas as pd
+
+from conversao import PADRAO_DATA, limpar_valor_monetario, normalizar_ids, serie_monetaria
+
+# Escrever numa aba muda as fórmulas das abas que dependem dela.
+# INPUT alimenta OUTPUT e COMUNICACAO; OUTPUT alimenta COMUNICACAO.
+DEPENDENCIAS = {
+    "input": ("input", "output", "comm"),
+    "output": ("output", "comm"),
+    "comm": ("comm",),
+}
+
+# Linha (1-based) do cabeçalho de cada aba; os dados começam na linha seguinte
+LINHA_CABECALHO = {"input": 4, "output": 7, "comm": 1}
+
+ESPERA_NOVA_CARGA = 10  # após falhar a carga em segundo plano, segundos até tentar de novo
+RECARGA_TOTAL_SEGUNDOS = 600  # mesmo sincronizando, recarrega tudo (e regrava o disco) de tempos em tempos
+LIMITE_PARCIAL = 0.2  # acima dessa fração de linhas alteradas, recarregar tudo sai mais barato
+MAX_INTERVALOS_POR_LEITURA = 100  # batch_get é um GET: muitos ranges estouram o limite da URL
+
+
+_RE_A1 = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+def letra_para_coluna(letras):
+    n = 0
+    for ch in letras:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def a1_para_intervalo(a1):
+    """'I5:P5' -> (5, 9, 5, 16); limites omitidos ('A:C', 'B8:B') viram None."""
+    m = _RE_A1.match(a1.split('!')[-1].replace('$', '').upper())
+    if not m:
+        raise ValueError(f"Range inválido: {a1}")
+    c1, r1, c2, r2 = m.groups()
+    if c2 is None and r2 is None:
+        c2, r2 = c1, r1
+    conv = lambda c: letra_para_coluna(c) if c else None
+    num = lambda r: int(r) if r else None
+    return num(r1), conv(c1), num(r2), conv(c2)
+
+
+def linhas_escritas(metodo, args, kwargs):
+    """Linhas (1-based) tocadas por update/batch_update/update_cell, ou None se não der para saber."""
+    try:
+        if metodo == "update_cell":
+            return {int(args[0])}
+        if metodo == "batch_update":
+            itens = [(d['range'], d['values']) for d in (args[0] if args else kwargs['data'])]
+        else:
+            rng = next((a for a in args if isinstance(a, str)), kwargs.get('range_name'))
+            vals = next((a for a in args if isinstance(a, list)), kwargs.get('values'))
+            itens = [(rng, vals)]
+        linhas = set()
+        for rng, vals in itens:
+            r1 = a1_para_intervalo(rng)[0]
+            if r1 is None:
+                return None
+            linhas.update(range(r1, r1 + max(len(vals), 1)))
+        return linhas
+    except (ValueError, KeyError, IndexError, TypeError, StopIteration):
+        return None
+
+
+def coluna_letra(coluna):
+    """1 -> A, 26 -> Z, 27 -> AA."""
+    letras = ""
+    while coluna:
+        coluna, resto = divmod(coluna - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def agrupar_intervalos(celulas):
+    """Converte [(linha, coluna, valor)] em ranges para batch_update.
+
+    Células da mesma coluna em linhas consecutivas viram um único range
+    (ex.: Z8:Z10), reduzindo o payload da requisição.
+    """
+    por_coluna = {}
+    for linha, coluna, valor in celulas:
+        por_coluna.setdefault(coluna, {})[linha] = valor  # a última escrita vence
+    ranges = []
+    for coluna in sorted(por_coluna):
+        linhas = por_coluna[coluna]
+        letra = coluna_letra(coluna)
+        bloco = []
+        for linha in sorted(linhas):
+            if bloco and linha != bloco[-1] + 1:
+                ranges.append(_range_coluna(letra, bloco, linhas))
+                bloco = []
+            bloco.append(linha)
+        if bloco:
+            ranges.append(_range_coluna(letra, bloco, linhas))
+    return ranges
+
+
+def _range_coluna(letra, bloco, linhas):
+    a1 = f"{letra}{bloco[0]}" if len(bloco) == 1 else f"{letra}{bloco[0]}:{letra}{bloco[-1]}"
+    return {'range': a1, 'values': [[linhas[l]] for l in bloco]}
+
+
+class ColetorCelulas:
+    """Acumula escritas de células durante uma passada e envia tudo num só batch_update."""
+
+    def __init__(self):
+        self.celulas = []
+
+    def adicionar(self, linha, coluna, valor):
+        self.celulas.append((linha, coluna, valor))
+
+    def lote(self):
+        """Dados do batch_update acumulado, para quem grava depois (ex.: a fila de escritas)."""
+        return agrupar_intervalos(self.celulas)
+
+
+def celulas_alteradas(base, editado, colunas):
+    """[(linha, coluna, valor novo, valor da base)] das células que mudaram entre `base` e `editado`.
+
+    `colunas` mapeia o nome no DataFrame para a coluna (1-based) na aba; a linha
+    vem da coluna `_linha` da projeção. Vazio e None contam como iguais.
+    """
+    celulas = []
+    for nome, coluna in colunas.items():
+        antes = base[nome].astype(object).fillna("").astype(str)
+        depois = editado[nome].reindex(base.index).astype(object).fillna("").astype(str)
+        mudou = antes != depois
+        celulas += [(int(l), coluna, d, a) for l, d, a in zip(base.loc[mudou, "_linha"], depois[mudou], antes[mudou])]
+    return celulas
+
+
+def conflitos_com_base(aba, celulas):
+    """{(linha, coluna): valor atual} das `celulas` que já não têm o valor da base na planilha.
+
+    Lê numa só requisição os mesmos ranges contíguos que serão gravados; serve
+    para não sobrescrever o que outra pessoa gravou depois que a tela carregou.
+    """
+    ranges = agrupar_intervalos([(l, c, antes) for l, c, _, antes in celulas])
+    blocos = ler_intervalos(aba, [r['range'] for r in ranges])
+    conflitos = {}
+    for r, bloco in zip(ranges, blocos):
+        linha, coluna = a1_para_intervalo(r['range'])[:2]
+        for j, (esperado,) in enumerate(r['values']):
+            atual = bloco[j][0] if j < len(bloco) and bloco[j] else ""
+            if str(atual).strip() != str(esperado).strip():
+                conflitos[(linha + j, coluna)] = atual
+    return conflitos
+
+
+def aparar_linha(linha):
+    # A API omite células vazias no fim da linha; aparamos para comparar snapshots
+    linha = list(linha)
+    while linha and linha[-1] == "":
+        linha.pop()
+    return linha
+
+
+def ler_intervalos(aba, ranges, por_leitura=MAX_INTERVALOS_POR_LEITURA):
+    """batch_get de `ranges` em requisições de até `por_leitura` ranges, com os blocos na ordem pedida."""
+    blocos = []
+    for i in range(0, len(ranges), por_leitura):
+        blocos += aba.batch_get(ranges[i:i + por_leitura])
+    return blocos
+
+
+def ler_linhas(aba, linhas, ultima_coluna=41, primeira_coluna=1):
+    """Lê só as linhas pedidas (A:AO por padrão) com batch_get.
+
+    Linhas vizinhas vão num mesmo range; o resultado segue a ordem de `linhas`.
+    """
+    if not linhas:
+        return []
+    seqs = _sequencias(linhas)
+    blocos = ler_intervalos(aba, [f"{coluna_letra(primeira_coluna)}{a}:{coluna_letra(ultima_coluna)}{b}"
+                                  for a, b in seqs])
+    lidas = {}
+    for (a, b), bloco in zip(seqs, blocos):
+        for l in range(a, b + 1):
+            lidas[l] = aparar_linha(bloco[l - a] if l - a < len(bloco) else [])
+    return [lidas[l] for l in linhas]
+
+
+def mesmos_valores(atuais, novos):
+    """Se os valores lidos da planilha (texto formatado) já são os `novos` que seriam gravados.
+
+    Números valem pelo valor ("1.500,00" == 1500.0), datas pelo dia e mês
+    ("05/03/2026" == "05/03") e o resto pelo texto, sem espaços nas pontas.
+    """
+    atuais = list(atuais) + [""] * (len(novos) - len(atuais))
+    for atual, novo in zip(atuais, novos):
+        if isinstance(novo, (int, float)) and not isinstance(novo, bool):
+            igual = abs(limpar_valor_monetario(atual) - float(novo)) < 0.005
+        else:
+            datas = [re.fullmatch(PADRAO_DATA, str(v).strip()) for v in (atual, novo)]
+            if all(datas):
+                igual = [int(g) for g in datas[0].groups()[:2]] == [int(g) for g in datas[1].groups()[:2]]
+            else:
+                igual = str(atual).strip() == str(novo).strip()
+        if not igual:
+            return False
+    return True
+
+
+def aguardar_recalculo(aba, linhas, antes, prazo=12, intervalo=0.3, fator=1.6, intervalo_max=2.0, esperadas=None):
+    """Espera as fórmulas recalcularem após uma escrita, no lugar de um sleep fixo.
+
+    Faz polling das `linhas` com backoff crescente até que todas as
+    `esperadas` (por padrão, todas) difiram de `antes` (lidas com ler_linhas
+    antes da escrita) ou até estourar o `prazo` em segundos. As outras linhas
+    só são lidas: uma escrita que não mudou o INPUT também não muda o OUTPUT,
+    e sem nenhuma linha esperada a leitura é imediata. Retorna (linhas atuais,
+    pronto); com pronto=False o prazo acabou e as esperadas ainda iguais a
+    `antes` podem estar desatualizadas (quem chama decide linha a linha).
+    """
+    esperadas = set(linhas if esperadas is None else esperadas)
+    if not esperadas & set(linhas):
+        return ler_linhas(aba, linhas), True
+    limite = time.monotonic() + prazo
+    while True:
+        time.sleep(intervalo)
+        atuais = ler_linhas(aba, linhas)
+        if all(a != b for l, a, b in zip(linhas, atuais, antes) if l in esperadas):
+            return atuais, True
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            return atuais, False
+        intervalo = min(intervalo * fator, intervalo_max, restante)
+
+
+def _sequencias(indices):
+    # [1, 2, 3, 8, 9] -> [(1, 3), (8, 9)]
+    seqs = []
+    for i in sorted(set(indices)):
+        if seqs and i == seqs[-1][1] + 1:
+            seqs[-1] = (seqs[-1][0], i)
+        else:
+            seqs.append((i, i))
+    return seqs
+
+
+class Projecao:
+    """Conjunto nomeado de colunas de uma aba, lido com um único batch_get.
+
+    `colunas` mapeia o nome da coluna no DataFrame para o índice 0-based na aba
+    ou para o texto do cabeçalho (resolvido uma vez e memorizado). Colunas em
+    `categorias` viram category e as de `monetarias` viram float.
+    """
+
+    def __init__(self, aba, colunas, categorias=(), monetarias=()):
+        self.aba = aba
+        self.linha_cabecalho = LINHA_CABECALHO[aba]
+        self.colunas = colunas
+        self.categorias = categorias
+        self.monetarias = monetarias
+        self._indices = None
+
+    def resolver(self, worksheet):
+        if self._indices is None:
+            cabecalho = []
+            if any(isinstance(c, str) for c in self.colunas.values()):
+                bloco = worksheet.batch_get([f"{self.linha_cabecalho}:{self.linha_cabecalho}"])[0]
+                cabecalho = [str(c).strip() for c in (bloco[0] if bloco else [])]
+            indices = {}
+            for nome, col in self.colunas.items():
+                if isinstance(col, str):
+                    if col not in cabecalho:
+                        raise KeyError(f"Coluna '{col}' não encontrada no cabeçalho da aba {self.aba}")
+                    col = cabecalho.index(col)
+                indices[nome] = col
+            self._indices = indices
+        return self._indices
+
+    def ler(self, worksheet):
+        indices = self.resolver(worksheet)
+        inicio = self.linha_cabecalho + 1
+        seqs = _sequencias(indices.values())
+        blocos = worksheet.batch_get([f"{coluna_letra(a + 1)}{inicio}:{coluna_letra(b + 1)}" for a, b in seqs])
+        n = max((len(b) for b in blocos), default=0)
+        colunas = {}
+        for (a, b), bloco in zip(seqs, blocos):
+            bloco = list(bloco) + [[]] * (n - len(bloco))
+            for j in range(b - a + 1):
+                colunas[a + j] = [r[j] if j < len(r) else "" for r in bloco]
+        df = pd.DataFrame({nome: colunas[col] for nome, col in indices.items()})
+        df["_linha"] = range(inicio, inicio + n)
+        for nome in self.categorias:
+            df[nome] = df[nome].astype("category")
+        for nome in self.monetarias:
+            df[nome] = serie_monetaria(df[nome])
+        return df
+
+    def recarregar_linhas(self, worksheet, df, linhas):
+        """Relê só `linhas` da projeção e devolve uma cópia de `df` com elas atualizadas."""
+        inicio = self.linha_cabecalho + 1
+        linhas = sorted(linhas)
+        if not linhas:
+            return df
+        if linhas[0] < inicio or linhas[-1] >= inicio + len(df) or len(linhas) > LIMITE_PARCIAL * len(df):
+            return None
+        indices = self.resolver(worksheet)
+        # Um range por sequência de linhas vizinhas, da primeira à última coluna
+        # projetada (mais barato que um range por coluna e por linha)
+        primeira, ultima = min(indices.values()), max(indices.values())
+        faixas = _sequencias(linhas)
+        blocos = ler_intervalos(worksheet, [f"{coluna_letra(primeira + 1)}{p}:{coluna_letra(ultima + 1)}{u}"
+                                            for p, u in faixas])
+        valores = {}
+        for (p, u), bloco in zip(faixas, blocos):
+            for l in range(p, u + 1):
+                linha = list(bloco[l - p]) if l - p < len(bloco) else []
+                for c in indices.values():
+                    valores[(l, c)] = linha[c - primeira] if c - primeira < len(linha) else ""
+        novo = df.copy()
+        posicoes = [l - inicio for l in linhas]
+        for nome, col in indices.items():
+            serie = pd.Series([valores[(l, col)] for l in linhas], index=novo.index[posicoes])
+            if nome in self.monetarias:
+                serie = serie_monetaria(serie)
+            elif nome in self.categorias:
+                faltam = set(serie) - set(novo[nome].cat.categories)
+                if faltam:
+                    novo[nome] = novo[nome].cat.add_categories(sorted(faltam))
+            novo.loc[serie.index, nome] = serie
+        return novo
+
+    def sincronizar(self, worksheet, df):
+        """Relê todas as colunas da projeção e devolve `df` (o mesmo objeto) se nada mudou.
+
+        Projeções são estreitas, então reler tudo sai quase tão barato quanto sondar;
+        manter o objeto preserva o que foi derivado dele (ver CacheSnapshots.memo).
+        """
+        novo = self.ler(worksheet)
+        if len(novo) != len(df):
+            return novo
+        for nome in self.resolver(worksheet):
+            if nome in self.monetarias:
+                igual = novo[nome].equals(df[nome])
+            else:
+                igual = (novo[nome].astype(object).fillna("").astype(str)
+                         .equals(df[nome].astype(object).fillna("").astype(str)))
+            if not igual:
+                return novo
+        return df
+
+
+# Colunas que cada página realmente usa
+PROJECOES = {
+    "input_clientes": Projecao("input", {"Key": 1, "Clientes": 2, "Status": 3, "SQUAD": 5,
+                                         "Verba Meta": 6, "Verba Google": 7},
+                               categorias=("Status", "SQUAD"), monetarias=("Verba Meta", "Verba Google")),
+    "output_chaves": Projecao("output", {"Key": 1}),
+    "output_dashboard": Projecao("output", {"Key": 1, "Clientes": 2, "Status": 3, "SQUAD": "SQUAD",
+                                            "Status Meta": 28, "Status Google": 40},
+                                 categorias=("Status", "SQUAD")),
+    # Visão de todos os squads: checks, valores a emitir e status numa leitura só
+    "output_resumo": Projecao("output", {"Key": 1, "Clientes": 2, "Status": 3, "SQUAD": "SQUAD",
+                                         "Check 1 FB": 8, "Check 1 GL": 9, "Check 2": 12, "Check 3": 15,
+                                         "Check 4 Meta": 17, "Check 4 Google": 19,
+                                         "A Emitir Meta": 24, "A Emitir Google": 36,
+                                         "Status Meta": 28, "Status Google": 40},
+                              categorias=("Status", "SQUAD"), monetarias=("A Emitir Meta", "A Emitir Google")),
+    "comm_contatos": Projecao("comm", {"Key": 1, "Cliente": 2, "Contato": 6, "E-mail": 8, "Telefone": 9}),
+}
+
+
+def registros_por_chave(df, coluna="Key"):
+    """{key normalizada: registro (dict com `_linha`)}; em keys repetidas vale a primeira."""
+    indice = {}
+    for chave, registro in zip(normalizar_ids(df[coluna]), df.to_dict("records")):
+        if chave:
+            indice.setdefault(chave, registro)
+    return indice
+
+
+def _chaves_do_valor(df, linhas):
+    # Keys das `linhas` numa projeção (DataFrame com Key/_linha)
+    if "Key" not in df.columns:
+        return None
+    return set(normalizar_ids(df.loc[df["_linha"].isin(linhas), "Key"]))
+
+
+def _linhas_das_chaves(df, chaves):
+    if "Key" not in df.columns:
+        return None
+    return set(df.loc[normalizar_ids(df["Key"]).isin(chaves), "_linha"])
+
+
+class CacheSnapshots:
+    """Projeções das abas (ver PROJECOES) compartilhadas entre todas as sessões.
+
+    Cada projeção fica em memória por `ttl` segundos ou até alguém escrever na
+    aba (ou numa aba da qual ela depende). Os DataFrames são compartilhados:
+    quem lê não deve modificá-los.
+
+    Com `disco` (ver persistencia.SnapshotsEmDisco), cada projeção carregada
+    por inteiro é gravada em disco. Num processo novo, o primeiro pedido de
+    uma projeção devolve a cópia do disco na hora e a carga da planilha segue
+    em segundo plano; até ela terminar a entrada aparece em `antigos()`.
+    """
+
+    def __init__(self, ttl=60, recarga_total=RECARGA_TOTAL_SEGUNDOS, disco=None):
+        self.ttl = ttl
+        self.recarga_total = recarga_total
+        self._disco = disco
+        self._antigos = {}  # chave -> salvo em (epoch), enquanto vale a cópia do disco
+        self._carregando = set()
+        self._falhas = {}  # chave -> (mensagem, quando)
+        self._lidos_do_disco = set()
+        self._dados = {}  # chave -> (validado em, valor, carga completa em)
+        self._sujas = {}  # chave -> linhas escritas desde a última leitura
+        self._lock = threading.Lock()
+        self._locks_aba = {}
+        self._indices = {}
+
+    def _lock_da_aba(self, nome):
+        with self._lock:
+            return self._locks_aba.setdefault(nome, threading.Lock())
+
+    def obter(self, nome, carregar, forcar=False, recarregar_linhas=None, sincronizar=None):
+        """Valor em cache de `nome`, atualizado do jeito mais barato possível.
+
+        - linhas marcadas por escritas são relidas com `recarregar_linhas(valor, linhas)`;
+        - vencido o TTL, tenta `sincronizar(valor)` antes de recarregar tudo;
+        - qualquer um dos dois pode devolver None para pedir a carga completa.
+        """
+        # Um lock por aba: se várias sessões pedirem a mesma aba expirada,
+        # só uma baixa e as outras reaproveitam o resultado.
+        with self._lock_da_aba(nome):
+            antigo = nome in self._antigos and nome in self._dados
+            if not forcar and (antigo or self._carregar_do_disco(nome)):
+                self._carregar_em_segundo_plano(nome, carregar)
+                return self._dados[nome][1]
+            with self._lock:
+                sujas = self._sujas.pop(nome, None)
+            item = self._dados.get(nome)
+            agora = time.monotonic()
+            if item and not forcar:
+                validado, valor, carga = item
+                if sujas:
+                    valor = recarregar_linhas(valor, sujas) if recarregar_linhas else None
+                if valor is not None:
+                    if agora - validado < self.ttl:
+                        self._dados[nome] = (validado, valor, carga)
+                        return valor
+                    if sincronizar and agora - carga < self.recarga_total:
+                        valor = sincronizar(valor)
+                        if valor is not None:
+                            self._dados[nome] = (agora, valor, carga)
+                            return valor
+            valor = carregar()
+            self._guardar_carga(nome, valor)
+            return valor
+
+    def _guardar_carga(self, nome, valor):
+        agora = time.monotonic()
+        with self._lock:
+            self._dados[nome] = (agora, valor, agora)
+            self._antigos.pop(nome, None)
+            self._falhas.pop(nome, None)
+        if self._disco:
+            self._disco.salvar(nome, valor)
+
+    def _carregar_do_disco(self, nome):
+        # Só no primeiro pedido de cada entrada no processo (depois de reiniciar)
+        if not self._disco or nome in self._dados or nome in self._lidos_do_disco:
+            return False
+        self._lidos_do_disco.add(nome)
+        salvo = self._disco.ler(nome)
+        if salvo is None:
+            return False
+        valor, salvo_em = salvo
+        with self._lock:
+            # Já vencido: qualquer escrita ou recarga posterior substitui a cópia
+            self._dados[nome] = (float("-inf"), valor, float("-inf"))
+            self._antigos[nome] = salvo_em
+        return True
+
+    def _carregar_em_segundo_plano(self, nome, carregar):
+        with self._lock:
+            falha = self._falhas.get(nome)
+            if nome in self._carregando or (falha and time.monotonic() - falha[1] < ESPERA_NOVA_CARGA):
+                return
+            self._carregando.add(nome)
+
+        def _carregar():
+            try:
+                valor = carregar()
+            except Exception as e:
+                with self._lock:
+                    self._falhas[nome] = (f"{type(e).__name__}: {e}", time.monotonic())
+            else:
+                self._guardar_carga(nome, valor)
+            finally:
+                with self._lock:
+                    self._carregando.discard(nome)
+
+        threading.Thread(target=_carregar, name=f"carregar-{nome}", daemon=True).start()
+
+    def antigos(self):
+        """{entrada: salvo em (epoch)} das que ainda mostram a cópia do disco."""
+        with self._lock:
+            return dict(self._antigos)
+
+    def falhas(self):
+        """{entrada: erro} das cargas em segundo plano que falharam por último."""
+        with self._lock:
+            return {nome: msg for nome, (msg, _) in self._falhas.items()}
+
+    def memo(self, chave, snapshot, calcular):
+        # Estruturas derivadas valem enquanto o snapshot for o mesmo objeto
+        item = self._indices.get(chave)
+        if item and item[0] is snapshot:
+            return item[1]
+        resultado = calcular(snapshot)
+        self._indices[chave] = (snapshot, resultado)
+        return resultado
+
+    def _entradas(self, aba):
+        # Projeções da aba ("output:output_chaves", ...)
+        return [c for c in self._dados if c.startswith(aba + ":")]
+
+    def invalidar_linhas(self, nome, linhas):
+        """Escrita em `linhas` da aba `nome`: marca só essas linhas para recarga parcial.
+
+        Nas abas dependentes, marca as linhas das mesmas keys; se não der para
+        descobrir quais são, a entrada inteira é descartada. Retorna as keys
+        das linhas escritas (None se não deu para saber).
+        """
+        with self._lock:
+            chaves = None
+            for chave in self._entradas(nome):
+                chaves = _chaves_do_valor(self._dados[chave][1], linhas)
+                if chaves is not None:
+                    break
+            for dep in DEPENDENCIAS.get(nome, (nome,)):
+                for chave in self._entradas(dep):
+                    if dep == nome:
+                        alvo = linhas
+                    elif chaves is None:
+                        alvo = None
+                    else:
+                        alvo = _linhas_das_chaves(self._dados[chave][1], chaves)
+                    if alvo is None:
+                        del self._dados[chave]
+                        self._sujas.pop(chave, None)
+                    elif alvo:
+                        self._sujas.setdefault(chave, set()).update(alvo)
+            return chaves
+
+    def invalidar(self, nome=None):
+        with self._lock:
+            if nome is None:
+                self._dados.clear()
+                self._sujas.clear()
+                self._indices.clear()
+                return
+            for dep in DEPENDENCIAS.get(nome, (nome,)):
+                for chave in self._entradas(dep):
+                    del self._dados[chave]
+                    self._sujas.pop(chave, None)
+                for chave in [c for c in self._indices if c[0].startswith(dep + ":")]:
+                    del self._indices[chave]
+
+
+class AbaCacheada:
+    """Envolve uma worksheet: leituras completas passam pelo cache, escritas invalidam.
+
+    Com um `barramento` (ver barramento.Barramento), cada escrita também é
+    anunciada às outras sessões.
+    """
+
+    def __init__(self, nome, aba, cache, barramento=None):
+        self.nome = nome
+        self._aba = aba
+        self._cache = cache
+        self._barramento = barramento
+
+    def projecao(self, nome, atualizar=False):
+        """DataFrame tipado só com as colunas da projeção `nome` (ver PROJECOES), via cache."""
+        proj = PROJECOES[nome]
+        return self._cache.obter(f"{self.nome}:{nome}", lambda: proj.ler(self._aba), forcar=atualizar,
+                                 recarregar_linhas=lambda df, ls: proj.recarregar_linhas(self._aba, df, ls),
+                                 sincronizar=lambda df: proj.sincronizar(self._aba, df))
+
+    def por_chave(self, nome, atualizar=False):
+        """Retorna (projeção, registros por key normalizada), indexados uma vez por snapshot."""
+        df = self.projecao(nome, atualizar=atualizar)
+        return df, self._cache.memo((f"{self.nome}:{nome}", "registros"), df, registros_por_chave)
+
+    def _escrever(self, metodo, args, kwargs):
+        try:
+            return getattr(self._aba, metodo)(*args, **kwargs)
+        finally:
+            # Sabendo as linhas escritas, só elas são relidas depois
+            linhas = linhas_escritas(metodo, args, kwargs)
+            chaves = None
+            if linhas is None:
+                self._cache.invalidar(self.nome)
+            else:
+                chaves = self._cache.invalidar_linhas(self.nome, linhas)
+            if self._barramento:
+                self._barramento.publicar(self.nome, linhas, chaves)
+
+    def update(self, *args, **kwargs):
+        return self._escrever("update", args, kwargs)
+
+    def batch_update(self, *args, **kwargs):
+        return self._escrever("batch_update", args, kwargs)
+
+    def update_cell(self, *args, **kwargs):
+        return self._escrever("update_cell", args, kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._aba, attr)
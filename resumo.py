@@ -0,0 +1,66 @@
+"""Visão consolidada de todos os squads a partir de um único snapshot do OUTPUT.
+
+O snapshot (projeção `output_resumo`) é lido uma vez, dividido por SQUAD com
+um groupby e cada squad é resumido num pool de threads: valores a emitir
+ainda pendentes, clientes com check NOK e contagem dos status de Meta/Google.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+OPCOES_STATUS = ["EMITIDO", "ENVIADO", "NOK", "FINALIZADO", "ISENTO"]
+# Com esses status a emissão da plataforma já foi tratada; o resto (vazio, NOK) segue pendente
+STATUS_RESOLVIDOS = ("EMITIDO", "ENVIADO", "FINALIZADO", "ISENTO")
+CHECKS = ["Check 1 FB", "Check 1 GL", "Check 2", "Check 3", "Check 4 Meta", "Check 4 Google"]
+CHECKS_VAZIO_OK = ("Check 1 FB", "Check 1 GL")  # check 1 vazio é plataforma não contratada
+MAX_THREADS = 8
+
+
+def _texto(serie):
+    return serie.astype(object).fillna("").astype(str).str.strip().str.upper()
+
+
+def checks_nok(df):
+    """Máscara (linhas x checks) dos checks que não estão OK."""
+    nok = {}
+    for nome in CHECKS:
+        valor = _texto(df[nome])
+        nok[nome] = (valor != "OK") & ~((valor == "") & (nome in CHECKS_VAZIO_OK))
+    return pd.DataFrame(nok, index=df.index)
+
+
+def resumir_squad(squad, df):
+    """Resumo de um squad: clientes, pendências de emissão, checks NOK e status."""
+    resumo = {"SQUAD": squad, "Clientes": len(df)}
+    pendente_total, qtd_pendente = 0.0, 0
+    for plataforma in ("Meta", "Google"):
+        valor = df[f"A Emitir {plataforma}"]
+        pendente = (valor > 0) & ~_texto(df[f"Status {plataforma}"]).isin(STATUS_RESOLVIDOS)
+        resumo[f"Pendente {plataforma}"] = float(valor[pendente].sum())
+        pendente_total += resumo[f"Pendente {plataforma}"]
+        qtd_pendente += int(pendente.sum())
+    resumo["Emissões pendentes"] = qtd_pendente
+    resumo["Pendente total"] = pendente_total
+
+    nok = checks_nok(df)
+    resumo["Clientes c/ check NOK"] = int(nok.any(axis=1).sum())
+    for nome in CHECKS:
+        resumo[f"NOK {nome}"] = int(nok[nome].sum())
+
+    status = pd.concat([_texto(df["Status Meta"]), _texto(df["Status Google"])])
+    contagem = status.value_counts()
+    for opcao in OPCOES_STATUS:
+        resumo[opcao] = int(contagem.get(opcao, 0))
+    resumo["Sem status"] = int(contagem.get("", 0))
+    return resumo
+
+
+def resumo_por_squad(df, max_threads=MAX_THREADS):
+    """DataFrame com uma linha por squad (e a linha TOTAL), calculado em paralelo."""
+    grupos = [(squad, g) for squad, g in df.groupby("SQUAD", observed=True, sort=True) if squad and squad != "-"]
+    if not grupos:
+        return pd.DataFrame()
+    with ThreadPoolExecutor(max_workers=min(max_threads, len(grupos))) as pool:
+        linhas = list(pool.map(lambda item: resumir_squad(*item), grupos))
+    total = {"SQUAD": "TOTAL", **{c: sum(l[c] for l in linhas) for c in linhas[0] if c != "SQUAD"}}
+    return pd.DataFrame(linhas + [total])